@@ -1,6 +1,7 @@
 from flask import Flask
 import os
 import socket
+from serve import serve
 
 app = Flask(__name__)
 
@@ -61,4 +62,4 @@ def student():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     print(f"Starting server on port {port}...")
-    app.run(host="0.0.0.0", port=port)
+    serve(app, port)
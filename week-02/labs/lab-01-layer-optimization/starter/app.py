@@ -3,12 +3,252 @@ Data Processor v1.0
 A simple data processing application that demonstrates layer caching issues.
 """
 
+import argparse
+import io
+import os
+import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def process_data():
-    """Process sample data files."""
+# Rows per chunk in --stream mode; memory use depends on this, not file size
+DEFAULT_CHUNKSIZE = 100_000
+# With --workers, files bigger than this are split into byte ranges of about this size
+DEFAULT_SPLIT_BYTES = 64 * 1024 * 1024
+
+
+class RunningStats:
+    """Count, sum, min, max, mean and variance folded one chunk at a time.
+
+    Chunks are merged with Chan et al.'s parallel form of Welford's update,
+    so memory stays constant however many chunks are folded in.
+
+    Count, min and max always match pandas on the whole column, and so does
+    the mean of an integer column, which is summed exactly (Python ints).
+    Float sums and the standard deviation are accumulated in a different
+    order than pandas uses, so they can differ from it in the last bit or
+    two (about 1e-16 relative) — far below the two decimals printed.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.low = None
+        self.high = None
+        # pandas reads the whole column as float if any value is a float or
+        # missing, so min and max are reported as floats if any chunk was
+        self.floats = False
+        self.mean_ = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+
+    def update(self, values):
+        """Fold in a pandas Series (NaNs are skipped, as pandas does)."""
+        self.floats = self.floats or not pd.api.types.is_integer_dtype(values)
+        values = values.dropna()
+        if len(values) == 0:
+            return
+        chunk = RunningStats()
+        chunk.count = len(values)
+        chunk.total = int(values.sum()) if pd.api.types.is_integer_dtype(values) else float(values.sum())
+        chunk.low, chunk.high = values.min(), values.max()
+        chunk.mean_ = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean_) ** 2).sum())
+        self.merge(chunk)
+
+    def merge(self, other):
+        """Fold in another RunningStats, e.g. a worker's partial result."""
+        self.floats = self.floats or other.floats
+        if other.count == 0:
+            return
+        combined = self.count + other.count
+        delta = other.mean_ - self.mean_
+        self.mean_ += delta * other.count / combined
+        self.m2 += other.m2 + delta * delta * self.count * other.count / combined
+        self.count = combined
+        self.total += other.total
+        self.low = other.low if self.low is None else min(self.low, other.low)
+        self.high = other.high if self.high is None else max(self.high, other.high)
+
+    def _as_column_type(self, value):
+        if value is None:
+            return float("nan")  # empty column, as pandas reports it
+        return float(value) if self.floats else value
+
+    @property
+    def min(self):
+        return self._as_column_type(self.low)
+
+    @property
+    def max(self):
+        return self._as_column_type(self.high)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float("nan")
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), like Series.std()."""
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else float("nan")
+
+
+def summarize_in_memory(csv_file):
+    """Load the whole file and summarize it with pandas."""
+    df = pd.read_csv(csv_file)
+    summary = {"rows": len(df), "columns": list(df.columns), "value": None}
+    if 'value' in df.columns:
+        summary["value"] = {
+            "mean": df['value'].mean(),
+            "std": df['value'].std(),
+            "max": df['value'].max(),
+            "min": df['value'].min(),
+        }
+    return summary
+
+
+def read_header(csv_file):
+    """Return (columns, offset of the first data row in bytes)."""
+    with open(csv_file, "rb") as f:
+        f.readline()
+        data_start = f.tell()
+    return list(pd.read_csv(csv_file, nrows=0).columns), data_start
+
+
+def split_ranges(csv_file, data_start, split_bytes):
+    """Cut the data rows into [start, end) byte ranges that begin on a new line.
+
+    Assumes no quoted field contains a newline, which holds for the simple
+    numeric drops this processor handles.
+    """
+    size = os.path.getsize(csv_file)
+    boundaries = [data_start]
+    with open(csv_file, "rb") as f:
+        for offset in range(data_start + split_bytes, size, split_bytes):
+            if offset <= boundaries[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()  # finish the line offset falls in
+            if f.tell() >= size:
+                break
+            boundaries.append(f.tell())
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+class RangeReader(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file."""
+
+    def __init__(self, f, start, end):
+        self.f = f
+        self.remaining = end - start
+        f.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def summarize_range(task):
+    """Fold one byte range of a CSV; runs in a worker process with --workers.
+
+    Returns (rows, RunningStats or None, seconds).
+    """
+    csv_file, start, end, columns, chunksize = task
+    began = time.perf_counter()
+    # Row counting still needs one column when there's no 'value' to aggregate
+    usecols = ['value'] if 'value' in columns else columns[:1]
+    rows = 0
+    stats = RunningStats() if 'value' in columns else None
+    with open(csv_file, "rb") as f:
+        reader = io.BufferedReader(RangeReader(f, start, end))
+        for chunk in pd.read_csv(reader, header=None, names=columns, usecols=usecols, chunksize=chunksize):
+            rows += len(chunk)
+            if stats is not None:
+                stats.update(chunk['value'])
+    return rows, stats, time.perf_counter() - began
+
+
+def summary_from_parts(columns, parts):
+    """Merge (rows, stats, seconds) parts, in order, into a file summary."""
+    rows = 0
+    stats = RunningStats()
+    for part_rows, part_stats, _ in parts:
+        rows += part_rows
+        if part_stats is not None:
+            stats.merge(part_stats)
+
+    summary = {"rows": rows, "columns": columns, "value": None}
+    if 'value' in columns:
+        summary["value"] = {"mean": stats.mean, "std": stats.std, "max": stats.max, "min": stats.min}
+    return summary
+
+
+def summarize_streaming(csv_file, chunksize=DEFAULT_CHUNKSIZE):
+    """Summarize a file chunk by chunk, reading only the columns needed."""
+    columns, data_start = read_header(csv_file)
+    part = summarize_range((csv_file, data_start, os.path.getsize(csv_file), columns, chunksize))
+    return summary_from_parts(columns, [part])
+
+
+def summarize_parallel(csv_files, workers, chunksize=DEFAULT_CHUNKSIZE, split_bytes=DEFAULT_SPLIT_BYTES):
+    """Summarize files on a pool of worker processes.
+
+    Every file, or every byte range of a large one, is a separate task.
+    Results come back in submission order and partials are merged in range
+    order, so the output doesn't depend on which worker finishes first.
+    Returns [(summary, parts, worker_seconds)] in csv_files order.
+    """
+    tasks = []
+    layout = []
+    for csv_file in csv_files:
+        columns, data_start = read_header(csv_file)
+        ranges = split_ranges(csv_file, data_start, split_bytes)
+        layout.append((columns, len(ranges)))
+        tasks.extend((csv_file, start, end, columns, chunksize) for start, end in ranges)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = iter(pool.map(summarize_range, tasks))
+        summaries = []
+        for columns, n_parts in layout:
+            parts = [next(results) for _ in range(n_parts)]
+            summaries.append((summary_from_parts(columns, parts), n_parts, sum(p[2] for p in parts)))
+    return summaries
+
+
+def print_summary(name, summary):
+    print(f"\n📊 {name}")
+    print(f"   Rows: {summary['rows']}")
+    print(f"   Columns: {summary['columns']}")
+
+    value = summary["value"]
+    if value is not None:
+        print(f"   Average value: {value['mean']:.2f}")
+        print(f"   Std dev: {value['std']:.2f}")
+        print(f"   Max value: {value['max']}")
+        print(f"   Min value: {value['min']}")
+
+
+def print_timings(csv_files, summaries, wall_seconds):
+    print("\n⏱️  Timing")
+    for csv_file, (summary, n_parts, seconds) in zip(csv_files, summaries):
+        print(f"   {csv_file.name}: {seconds:.2f}s across {n_parts} part(s), {summary['rows']} rows")
+    print(f"   Total: {wall_seconds:.2f}s wall clock")
+
+
+def process_data(stream=False, chunksize=DEFAULT_CHUNKSIZE, workers=1, split_bytes=DEFAULT_SPLIT_BYTES):
+    """Process sample data files.
+
+    stream=True reads each file in chunks of chunksize rows instead of
+    loading it whole, so multi-GB files fit in a small container.
+    workers > 1 streams files (split into split_bytes ranges) on that many
+    processes and adds a per-file timing report.
+    """
     print("Data Processor v1.0")
     print("=" * 50)
     
@@ -28,7 +268,7 @@ def process_data():
         print("✓ Created sample.csv")
     
     # Process all CSV files
-    csv_files = list(data_dir.glob('*.csv'))
+    csv_files = sorted(data_dir.glob('*.csv'))
     
     if not csv_files:
         print("No CSV files to process.")
@@ -36,19 +276,33 @@ def process_data():
     
     print(f"\nFound {len(csv_files)} CSV file(s):")
     
+    if workers > 1:
+        began = time.perf_counter()
+        summaries = summarize_parallel(csv_files, workers, chunksize, split_bytes)
+        for csv_file, (summary, _, _) in zip(csv_files, summaries):
+            print_summary(csv_file.name, summary)
+        print_timings(csv_files, summaries, time.perf_counter() - began)
+        print("\n" + "=" * 50)
+        print("✓ Processing complete!")
+        return
+
     for csv_file in csv_files:
-        df = pd.read_csv(csv_file)
-        print(f"\n📊 {csv_file.name}")
-        print(f"   Rows: {len(df)}")
-        print(f"   Columns: {list(df.columns)}")
-        
-        if 'value' in df.columns:
-            print(f"   Average value: {df['value'].mean():.2f}")
-            print(f"   Max value: {df['value'].max()}")
-            print(f"   Min value: {df['value'].min()}")
+        if stream:
+            summary = summarize_streaming(csv_file, chunksize)
+        else:
+            summary = summarize_in_memory(csv_file)
+        print_summary(csv_file.name, summary)
     
     print("\n" + "=" * 50)
     print("✓ Processing complete!")
 
 if __name__ == "__main__":
-    process_data()
+    parser = argparse.ArgumentParser(description="Summarize the CSV files in ./data")
+    parser.add_argument("--stream", action="store_true", help="read files in chunks instead of whole")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk with --stream")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (implies streaming)")
+    parser.add_argument(
+        "--split-bytes", type=int, default=DEFAULT_SPLIT_BYTES, help="byte-range size for splitting large files"
+    )
+    args = parser.parse_args()
+    process_data(stream=args.stream, chunksize=args.chunksize, workers=args.workers, split_bytes=args.split_bytes)
@@ -3,11 +3,40 @@ Vulnerable Flask Application
 This app is intentionally built with outdated dependencies for security scanning practice.
 """
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
 import requests
+from upstream import UpstreamClient
 
 app = Flask(__name__)
 
+# Upstream probed by /external; point it at a local stub server to test offline
+EXTERNAL_URL = os.environ.get("EXTERNAL_URL", "https://api.github.com/")
+
+upstream = UpstreamClient(
+    timeout=float(os.environ.get("EXTERNAL_TIMEOUT", 5)),
+    pool_size=int(os.environ.get("EXTERNAL_POOL_SIZE", 10)),
+    stale_if_error=float(os.environ.get("EXTERNAL_STALE_IF_ERROR", 300)),
+)
+
+# /external/batch: probes run at most EXTERNAL_BATCH_CONCURRENCY at a time, each
+# capped at EXTERNAL_PROBE_TIMEOUT seconds and the whole batch at
+# EXTERNAL_BATCH_DEADLINE. Only hosts in EXTERNAL_ALLOWED_HOSTS (comma-separated,
+# default: EXTERNAL_URL's host) may be probed, so the endpoint can't be used to
+# reach arbitrary internal services; "*" lifts the restriction.
+EXTERNAL_BATCH_MAX_TARGETS = int(os.environ.get("EXTERNAL_BATCH_MAX_TARGETS", 50))
+EXTERNAL_BATCH_CONCURRENCY = int(os.environ.get("EXTERNAL_BATCH_CONCURRENCY", 10))
+EXTERNAL_PROBE_TIMEOUT = float(os.environ.get("EXTERNAL_PROBE_TIMEOUT", 2))
+EXTERNAL_BATCH_DEADLINE = float(os.environ.get("EXTERNAL_BATCH_DEADLINE", 5))
+EXTERNAL_ALLOWED_HOSTS = {
+    host.strip().lower()
+    for host in os.environ.get("EXTERNAL_ALLOWED_HOSTS", urlparse(EXTERNAL_URL).hostname).split(",")
+    if host.strip()
+}
+
 @app.route("/")
 def home():
     return """
@@ -41,11 +70,12 @@ def version():
 def external():
     """Make a request to an external API to demonstrate requests usage"""
     try:
-        response = requests.get("https://api.github.com/", timeout=5)
+        response, source = upstream.get(EXTERNAL_URL)
         return jsonify({
             "status": "success",
-            "external_api": "github",
-            "response_code": response.status_code
+            "external_api": EXTERNAL_URL,
+            "response_code": response.status_code,
+            "cache": source
         })
     except Exception as e:
         return jsonify({
@@ -53,6 +83,73 @@ def external():
             "message": str(e)
         }), 500
 
+def target_error(url):
+    """Return why url may not be probed, or None if it may."""
+    if not isinstance(url, str):
+        return "target must be a URL string"
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "target must be an http(s) URL"
+    if "*" not in EXTERNAL_ALLOWED_HOSTS and parsed.hostname.lower() not in EXTERNAL_ALLOWED_HOSTS:
+        return "host not in EXTERNAL_ALLOWED_HOSTS"
+    return None
+
+
+def probe_result(url, future):
+    if not future.done():
+        future.cancel()
+        return {"url": url, "status": "timeout", "error": "batch deadline exceeded"}
+    try:
+        code, seconds = future.result()
+    except requests.Timeout as e:
+        return {"url": url, "status": "timeout", "error": str(e)}
+    except Exception as e:
+        return {"url": url, "status": "error", "error": str(e)}
+    return {
+        "url": url,
+        "status": "up" if code < 400 else "down",
+        "response_code": code,
+        "latency_ms": round(seconds * 1000, 1),
+    }
+
+
+@app.route("/external/batch", methods=["POST"])
+def external_batch():
+    """Probe many upstreams concurrently: POST {"targets": [url, ...]}"""
+    body = request.get_json(silent=True)
+    targets = body.get("targets") if isinstance(body, dict) else body
+    if not isinstance(targets, list) or not targets:
+        return jsonify({"status": "error", "message": "expected a JSON list of target URLs"}), 400
+    if len(targets) > EXTERNAL_BATCH_MAX_TARGETS:
+        return jsonify({
+            "status": "error",
+            "message": f"at most {EXTERNAL_BATCH_MAX_TARGETS} targets per batch"
+        }), 400
+
+    start = time.monotonic()
+    results = [None] * len(targets)
+    futures = {}
+    # Not a with-block: its exit would wait for stragglers past the deadline
+    executor = ThreadPoolExecutor(max_workers=min(EXTERNAL_BATCH_CONCURRENCY, len(targets)))
+    try:
+        for i, url in enumerate(targets):
+            error = target_error(url)
+            if error:
+                results[i] = {"url": url, "status": "rejected", "error": error}
+            else:
+                futures[i] = executor.submit(upstream.probe, url, EXTERNAL_PROBE_TIMEOUT)
+        wait(futures.values(), timeout=EXTERNAL_BATCH_DEADLINE)
+    finally:
+        executor.shutdown(wait=False)
+    for i, future in futures.items():
+        results[i] = probe_result(targets[i], future)
+
+    return jsonify({
+        "status": "success",
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 1),
+        "results": results
+    })
+
 if __name__ == "__main__":
     # Running on all interfaces (0.0.0.0) for container accessibility
     app.run(host="0.0.0.0", port=5000, debug=False)
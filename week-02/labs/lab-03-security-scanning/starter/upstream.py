@@ -0,0 +1,172 @@
+"""
+Cached HTTP client for the /external endpoint.
+
+One requests.Session is shared by every request, so connections (and their
+TLS sessions) are pooled and reused instead of handshaking on each call.
+Responses are cached in memory according to the upstream's Cache-Control
+header; once stale, they are revalidated with If-None-Match /
+If-Modified-Since, so an unchanged resource costs a 304 rather than a full
+body. Concurrent misses for the same URL share a single upstream fetch, and
+if the upstream fails or rate-limits us, a recent stale copy is served.
+"""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# probe() reads bodies up to this size so their connection can be reused
+PROBE_DRAIN_BYTES = 64 * 1024
+
+
+def parse_cache_control(value):
+    """Return {directive: value or True} from a Cache-Control header."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+class CachedResponse:
+    """The parts of an upstream response worth keeping."""
+
+    def __init__(self, status_code, headers, content, fresh_until):
+        self.status_code = status_code
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        self.content_type = headers.get("Content-Type")
+        self.content = content
+        self.fresh_until = fresh_until
+        self.validated_at = time.monotonic()
+
+
+class _Flight:
+    """An upstream fetch that other callers for the same URL can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class UpstreamClient:
+    """Pooled, caching, single-flight GET client."""
+
+    def __init__(self, timeout=5, pool_size=10, stale_if_error=300):
+        self.timeout = timeout
+        # Seconds past expiry a cached copy may stand in for a failing upstream
+        self.stale_if_error = stale_if_error
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Return (CachedResponse, source).
+
+        source is "hit", "miss", "revalidated", "shared" (waited on another
+        caller's fetch) or "stale" (upstream failed; served an expired copy).
+        Raises requests.RequestException if the upstream fails with nothing
+        usable cached.
+        """
+        cached = self._cache.get(url)
+        if cached is not None and cached.fresh_until > time.monotonic():
+            return cached, "hit"
+
+        with self._lock:
+            flight = self._flights.get(url)
+            leader = flight is None
+            if leader:
+                flight = self._flights[url] = _Flight()
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                raise requests.Timeout(f"Timed out waiting for in-flight fetch of {url}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result[0], "shared"
+
+        try:
+            flight.result = self._fetch(url, cached)
+            return flight.result
+        except requests.RequestException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[url]
+            flight.done.set()
+
+    def probe(self, url, timeout):
+        """GET url uncached and return (status_code, seconds).
+
+        The time covers the headers only (stream=True). Closing a response
+        whose body wasn't read closes its socket, so a body of known length
+        up to PROBE_DRAIN_BYTES is read first and the connection goes back
+        to the pool; larger or chunked bodies cost a new connection instead.
+        """
+        start = time.monotonic()
+        with self.session.get(url, timeout=timeout, stream=True, allow_redirects=False) as response:
+            elapsed = time.monotonic() - start
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) <= PROBE_DRAIN_BYTES:
+                response.content
+            return response.status_code, elapsed
+
+    def _fetch(self, url, cached):
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            if self._usable_stale(cached):
+                return cached, "stale"
+            raise
+
+        if response.status_code == 304 and cached is not None:
+            cached.fresh_until = self._fresh_until(response.headers)
+            cached.validated_at = time.monotonic()
+            return cached, "revalidated"
+        if (response.status_code == 429 or response.status_code >= 500) and self._usable_stale(cached):
+            return cached, "stale"
+
+        entry = CachedResponse(
+            response.status_code, response.headers, response.content, self._fresh_until(response.headers)
+        )
+        if self._storable(response):
+            self._cache[url] = entry
+        return entry, "miss"
+
+    def _fresh_until(self, headers):
+        directives = parse_cache_control(headers.get("Cache-Control"))
+        if "no-cache" in directives:
+            return 0  # stored, but revalidated on every use
+        # We're a cache shared by all our clients, so s-maxage wins
+        max_age = directives.get("s-maxage", directives.get("max-age"))
+        try:
+            return time.monotonic() + max(int(max_age), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _storable(self, response):
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+        if "no-store" in directives or "private" in directives:
+            return False
+        # Without a lifetime or a validator there is nothing to reuse
+        has_validator = "ETag" in response.headers or "Last-Modified" in response.headers
+        return response.status_code == 200 and (has_validator or "max-age" in directives or "s-maxage" in directives)
+
+    def _usable_stale(self, cached):
+        if cached is None:
+            return False
+        expired_at = max(cached.fresh_until, cached.validated_at)
+        return time.monotonic() - expired_at <= self.stale_if_error
@@ -1,77 +1,345 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+import base64
+import glob
+import json
 import os
 import mysql.connector
-import time
 import socket
+from datetime import datetime
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, generate_latest, multiprocess
+from db import db_connection, direct_connection, discard
+from items_cache import ITEMS_CACHE_ENABLED, ITEMS_CACHE_TTL, items_cache
+from migrations import migrate, schema_is_current
+from search import ITEMS_PLAN_CHECK, build_search, check_plans
+from serve import serve
 
 app = Flask(__name__)
 
-DB_CONFIG = {
-    "host": os.environ.get("DB_HOST", "db"),
-    "user": os.environ.get("DB_USER", "appuser"),
-    "password": os.environ.get("DB_PASSWORD", "apppass"),
-    "database": os.environ.get("DB_NAME", "appdb"),
-}
+# Under gunicorn each worker counts on its own; with this set, prometheus_client
+# keeps values in per-process files here and /metrics adds them all up
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
 
+# Pagination and streaming
+ITEMS_DEFAULT_LIMIT = int(os.environ.get("ITEMS_DEFAULT_LIMIT", 100))
+ITEMS_MAX_LIMIT = int(os.environ.get("ITEMS_MAX_LIMIT", 1000))
+ITEMS_STREAM_BATCH = int(os.environ.get("ITEMS_STREAM_BATCH", 1000))
 
-def get_db_connection():
-    """Get a database connection with retry logic."""
-    for attempt in range(5):
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except mysql.connector.Error as e:
-            print(f"DB connection attempt {attempt + 1} failed: {e}")
-            time.sleep(2)
-    raise Exception("Could not connect to database after 5 attempts")
+# Rows per INSERT transaction for POST /api/items/bulk. Each batch is sent as
+# one multi-row INSERT, so ?batch_size= is capped to stay under MySQL's
+# max_allowed_packet (64MB by default; 5000 names of 255 bytes is ~1.3MB)
+ITEMS_BULK_BATCH = int(os.environ.get("ITEMS_BULK_BATCH", 1000))
+ITEMS_BULK_MAX_BATCH = int(os.environ.get("ITEMS_BULK_MAX_BATCH", 5000))
+
+bulk_rows = Counter("items_api_bulk_rows", "Rows inserted through POST /api/items/bulk")
 
 
 def init_db():
-    """Create the items table if it doesn't exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS items (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    # Seed some data if empty
-    cursor.execute("SELECT COUNT(*) FROM items")
-    if cursor.fetchone()[0] == 0:
-        cursor.executemany(
-            "INSERT INTO items (name) VALUES (%s)",
-            [("Widget",), ("Gadget",), ("Doohickey",)]
-        )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """Apply any pending schema migrations (see migrations.py), then check query plans.
+
+    The plan check needs the finished schema, so it is skipped while another
+    replica holds the migration lock rather than failing on missing tables
+    or indexes.
+    """
+    problems = []
+    with direct_connection() as conn:
+        applied = migrate(conn)
+        if ITEMS_PLAN_CHECK != "off":
+            if schema_is_current(conn):
+                problems = check_plans(conn)
+            else:
+                print("Query plan check skipped: another replica is still migrating the schema")
+    if applied:
+        items_cache.bump()
+    for problem in problems:
+        print(f"Query plan check: {problem}")
+    if problems and ITEMS_PLAN_CHECK == "strict":
+        raise RuntimeError("Query plan check failed; see log for details")
 
 
 @app.route("/health")
 def health():
     try:
-        conn = get_db_connection()
-        conn.close()
+        # Checking a connection out of the pool pings it
+        with db_connection():
+            pass
         return jsonify({"status": "healthy", "hostname": socket.gethostname()})
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 
+def encode_cursor(last_id):
+    """Opaque next-page cursor: clients pass it back without parsing it."""
+    raw = json.dumps({"after_id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return int(json.loads(base64.urlsafe_b64decode(padded))["after_id"])
+
+
+def serialize_item(row):
+    return {"id": row["id"], "name": row["name"], "created_at": row["created_at"].isoformat()}
+
+
+def parse_page_args():
+    """Read after_id (or an opaque cursor) and limit from the query string.
+
+    Raises ValueError on anything malformed.
+    """
+    after_id = 0
+    if "cursor" in request.args:
+        try:
+            after_id = decode_cursor(request.args["cursor"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("invalid cursor")
+    elif "after_id" in request.args:
+        after_id = int(request.args["after_id"])
+    limit = request.args.get("limit")
+    limit = int(limit) if limit is not None else None
+    if after_id < 0 or (limit is not None and limit < 1):
+        raise ValueError("after_id must be >= 0 and limit >= 1")
+    return after_id, limit
+
+
+def stream_items(after_id, limit):
+    """Yield NDJSON, one batch of rows at a time.
+
+    The cursor is unbuffered, so rows are read off the MySQL socket as they
+    are fetched instead of materializing the whole result set in memory.
+    """
+    sql = "SELECT id, name, created_at FROM items WHERE id > %s ORDER BY id"
+    params = [after_id]
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        finished = False
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(ITEMS_STREAM_BATCH)
+                if not rows:
+                    break
+                yield "".join(json.dumps(serialize_item(row)) + "\n" for row in rows)
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+            else:
+                # The client went away (or a fetch failed) with rows still
+                # unread; don't hold this worker reading them all
+                discard(conn)
+
+
+def load_page(after_id, limit):
+    """Read one page from MySQL and return it as a JSON body."""
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        # One extra row tells us whether there is a next page
+        cursor.execute(
+            "SELECT id, name, created_at FROM items WHERE id > %s ORDER BY id LIMIT %s",
+            (after_id, limit + 1),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    items = [serialize_item(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+    return json.dumps({"items": items, "count": len(items), "next_cursor": next_cursor}).encode()
+
+
 @app.route("/api/items")
 def get_items():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, name, created_at FROM items")
-    items = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    # Convert datetime objects for JSON serialization
-    for item in items:
-        item["created_at"] = item["created_at"].isoformat()
-    return jsonify({"items": items, "count": len(items)})
+    """Keyset-paginated items: ?after_id=N or ?cursor=..., plus ?limit=.
+
+    ?format=ndjson (or Accept: application/x-ndjson) streams every row after
+    after_id — or the first limit rows — as newline-delimited JSON.
+    """
+    try:
+        after_id, limit = parse_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    wants_ndjson = request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if wants_ndjson:
+        response = Response(stream_items(after_id, limit), mimetype="application/x-ndjson")
+        response.vary.add("Accept")
+        return response
+
+    limit = min(limit or ITEMS_DEFAULT_LIMIT, ITEMS_MAX_LIMIT)
+    if ITEMS_CACHE_ENABLED:
+        body = items_cache.get_or_load(("page", after_id, limit), lambda: load_page(after_id, limit))
+    else:
+        body = load_page(after_id, limit)
+    response = Response(body, mimetype="application/json")
+    # The same URL also serves NDJSON, so caches must key on Accept too
+    response.vary.add("Accept")
+    if ITEMS_CACHE_ENABLED:
+        # Lets browsers and proxies reuse a page for as long as we do
+        response.cache_control.public = True
+        response.cache_control.max_age = ITEMS_CACHE_TTL
+    return response
+
+
+def parse_search_args():
+    """Read from/to (ISO 8601 datetimes), prefix and limit. Raises ValueError."""
+    created_from = request.args.get("from")
+    created_to = request.args.get("to")
+    created_from = datetime.fromisoformat(created_from) if created_from else None
+    created_to = datetime.fromisoformat(created_to) if created_to else None
+    prefix = request.args.get("prefix") or None
+    limit = int(request.args.get("limit", ITEMS_DEFAULT_LIMIT))
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    return created_from, created_to, prefix, min(limit, ITEMS_MAX_LIMIT)
+
+
+def load_search(created_from, created_to, prefix, limit):
+    """Run one search against MySQL and return it as a JSON body."""
+    sql, params = build_search(created_from, created_to, prefix, limit)
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    items = [serialize_item(row) for row in rows[:limit]]
+    return json.dumps({"items": items, "count": len(items), "truncated": len(rows) > limit}).encode()
+
+
+@app.route("/api/items/search")
+def search_items():
+    """Items filtered by ?from=&to= (created_at, end exclusive) and/or ?prefix= on name.
+
+    Ordered by name when a prefix is given, otherwise by created_at; at most
+    limit rows, with "truncated" set when more matched.
+    """
+    try:
+        args = parse_search_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if ITEMS_CACHE_ENABLED:
+        body = items_cache.get_or_load(("search",) + args, lambda: load_search(*args))
+    else:
+        body = load_search(*args)
+    response = Response(body, mimetype="application/json")
+    if ITEMS_CACHE_ENABLED:
+        response.cache_control.public = True
+        response.cache_control.max_age = ITEMS_CACHE_TTL
+    return response
+
+
+def parse_bulk_rows():
+    """Yield the name of each item in the request body.
+
+    A JSON array is parsed whole; NDJSON is read line by line off the request
+    stream, so arbitrarily large uploads never sit in memory at once. Each
+    item is {"name": ...} or a bare string. Raises ValueError on bad input.
+    """
+    if request.mimetype == "application/x-ndjson":
+        records = (line for line in request.stream if line.strip())
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            raise ValueError("body must be a JSON array or NDJSON")
+    for position, record in enumerate(records):
+        if isinstance(record, bytes):
+            try:
+                record = json.loads(record)
+            except ValueError:
+                raise ValueError(f"item {position}: invalid JSON")
+        name = record.get("name") if isinstance(record, dict) else record
+        if not isinstance(name, str) or not 0 < len(name) <= 255:
+            raise ValueError(f"item {position}: name must be a string of 1-255 characters")
+        yield name
+
+
+def insert_batch(conn, names):
+    """Insert names in one transaction; returns (first_id, last_id, seconds)."""
+    start = time.monotonic()
+    cursor = conn.cursor()
+    try:
+        # mysql-connector rewrites this into a single multi-row INSERT
+        cursor.executemany("INSERT INTO items (name) VALUES (%s)", [(name,) for name in names])
+        conn.commit()
+        # A single INSERT gets consecutive auto-increment IDs
+        first_id = cursor.lastrowid
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    bulk_rows.inc(len(names))
+    return first_id, first_id + len(names) - 1, time.monotonic() - start
+
+
+@app.route("/api/items/bulk", methods=["POST"])
+def bulk_insert_items():
+    """Insert many items from a JSON array or an NDJSON stream.
+
+    Rows are committed ITEMS_BULK_BATCH (or ?batch_size=, clamped to
+    ITEMS_BULK_MAX_BATCH) at a time. If an item is malformed (400) or a batch
+    fails in MySQL (500), the batches before it stay committed and are listed
+    in the response alongside the error.
+    """
+    try:
+        batch_size = int(request.args.get("batch_size", ITEMS_BULK_BATCH))
+        if batch_size < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer >= 1"}), 400
+    batch_size = min(batch_size, ITEMS_BULK_MAX_BATCH)
+
+    batches = []
+    error = None
+    status = 201
+    with db_connection() as conn:
+        pending = []
+        try:
+            for name in parse_bulk_rows():
+                pending.append(name)
+                if len(pending) == batch_size:
+                    batches.append(insert_batch(conn, pending))
+                    pending = []
+            if pending:
+                batches.append(insert_batch(conn, pending))
+        except ValueError as e:
+            error, status = str(e), 400
+        except mysql.connector.Error as e:
+            # insert_batch rolled the failed batch back; earlier ones are committed
+            error, status = f"database error: {e.msg}", 500
+    if batches:
+        items_cache.bump()
+
+    body = {
+        "inserted": sum(last - first + 1 for first, last, _ in batches),
+        "batches": [
+            {"first_id": first, "last_id": last, "rows": last - first + 1, "seconds": round(seconds, 4)}
+            for first, last, seconds in batches
+        ],
+    }
+    if error:
+        body["error"] = error
+    return jsonify(body), status
+
+
+@app.route("/metrics")
+def metrics():
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
 
 if __name__ == "__main__":
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Value files left by a previous run would be added to this one's
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
     init_db()
-    app.run(host="0.0.0.0", port=5000)
+    serve(app, 5000)
@@ -0,0 +1,208 @@
+"""
+MySQL connection pooling for the items API.
+
+Each process owns one bounded MySQLConnectionPool instead of opening a new
+connection (TCP handshake + MySQL auth) for every request. Checkouts wait up
+to DB_POOL_TIMEOUT seconds for a free connection, and the pool validates each
+connection on checkout (is_connected() pings it and reconnects if needed).
+
+One-off work in the gunicorn master (migrations) uses direct_connection()
+instead: a pool opened there would be inherited, unused, by every worker.
+
+Failures are retried by a RetryPolicy: exponential backoff with full jitter,
+capped by both an attempt count and a total deadline. Each attempt's connect
+timeout is part of that budget, so an attempt only starts if it can time out
+before the deadline. Startup is patient while MySQL boots; request paths fail
+fast instead of holding a worker.
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+from prometheus_client import Counter, Histogram
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "db"),
+    "user": os.environ.get("DB_USER", "appuser"),
+    "password": os.environ.get("DB_PASSWORD", "apppass"),
+    "database": os.environ.get("DB_NAME", "appdb"),
+}
+# Whole seconds: the C extension's connect timeout is an integer
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", 3))
+
+# mysql-connector caps a pool at 32 connections
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+
+pool_checkouts = Counter("items_api_db_pool_checkouts", "Connections checked out of the MySQL pool")
+pool_timeouts = Counter(
+    "items_api_db_pool_timeouts", "Checkouts that gave up waiting for a free pooled connection"
+)
+pool_wait_seconds = Histogram(
+    "items_api_db_pool_wait_seconds", "Time spent waiting for a free pooled connection"
+)
+
+db_retries = Counter("items_api_db_retries", "MySQL operations retried after a failure", ["policy"])
+db_retries_exhausted = Counter(
+    "items_api_db_retries_exhausted",
+    "MySQL operations abandoned after running out of attempts or deadline",
+    ["policy", "reason"],
+)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and a deadline.
+
+    attempt_timeout is the connect timeout each attempt runs with: an equal
+    share of the deadline, capped at DB_CONNECT_TIMEOUT, in whole seconds
+    (at least 1).
+    """
+
+    def __init__(self, name, attempts, base_delay, max_delay, deadline):
+        self.name = name
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = max(min(DB_CONNECT_TIMEOUT, int(deadline / attempts)), 1)
+
+    def run(self, func):
+        """Call func(), retrying mysql.connector errors until the policy gives up."""
+        start = time.monotonic()
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return func()
+            except mysql.connector.Error as e:
+                if attempt == self.attempts:
+                    db_retries_exhausted.labels(policy=self.name, reason="attempts").inc()
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                # Only retry if the next attempt can time out before the deadline
+                if time.monotonic() - start + delay + self.attempt_timeout > self.deadline:
+                    db_retries_exhausted.labels(policy=self.name, reason="deadline").inc()
+                    raise
+                db_retries.labels(policy=self.name).inc()
+                print(f"DB {self.name} attempt {attempt} failed, retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+
+# init_db() waits for MySQL to come up; requests give up quickly and return errors
+STARTUP_RETRY = RetryPolicy(
+    "startup",
+    attempts=int(os.environ.get("DB_STARTUP_ATTEMPTS", 10)),
+    base_delay=0.5,
+    max_delay=5,
+    deadline=float(os.environ.get("DB_STARTUP_DEADLINE", 60)),
+)
+# With the default 2s deadline a request attempt gets a 1s connect timeout,
+# leaving room for one retry after a quick failure (e.g. connection refused)
+REQUEST_RETRY = RetryPolicy(
+    "request",
+    attempts=int(os.environ.get("DB_REQUEST_ATTEMPTS", 2)),
+    base_delay=0.05,
+    max_delay=0.25,
+    deadline=float(os.environ.get("DB_REQUEST_DEADLINE", 2)),
+)
+
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def create_pool():
+    """Open a pool for this process (connects pool_size connections).
+
+    Pooled connections serve requests, and the pool reconnects them during
+    checkout, so they use the request policy's connect timeout.
+    """
+    return pooling.MySQLConnectionPool(
+        pool_name=f"items-api-{os.getpid()}",
+        pool_size=DB_POOL_SIZE,
+        connection_timeout=REQUEST_RETRY.attempt_timeout,
+        **DB_CONFIG,
+    )
+
+
+def get_pool(retry=REQUEST_RETRY):
+    """Return this process's pool, creating it under retry on first use.
+
+    Connections can't be shared across fork(), so a pre-forked worker builds
+    its own pool rather than inheriting the master's.
+    """
+    global _pool, _pool_pid, _slots
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                _pool = retry.run(create_pool)
+                _slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+@contextmanager
+def direct_connection(retry=STARTUP_RETRY):
+    """Open one unpooled connection, closed when the block exits."""
+    conn = retry.run(lambda: mysql.connector.connect(connection_timeout=retry.attempt_timeout, **DB_CONFIG))
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def db_connection(retry=REQUEST_RETRY):
+    """Check a connection out of the pool; it goes back when the block exits.
+
+    MySQLConnectionPool raises as soon as it is empty, so a semaphore sized to
+    the pool makes callers queue for up to DB_POOL_TIMEOUT seconds instead.
+    """
+    pool = get_pool(retry)
+    start = time.monotonic()
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        pool_timeouts.inc()
+        raise PoolError(f"No free DB connection after {DB_POOL_TIMEOUT:g}s")
+    pool_wait_seconds.observe(time.monotonic() - start)
+    try:
+        conn = retry.run(pool.get_connection)
+        pool_checkouts.inc()
+        try:
+            yield conn
+        finally:
+            try:
+                # close() on a pooled connection returns it to the pool
+                conn.close()
+            except mysql.connector.OperationalError:
+                # A discarded connection can't reset its session; it is back
+                # in the pool regardless and reconnects on its next checkout
+                pass
+    finally:
+        _slots.release()
+
+
+def discard(conn):
+    """Abort a checked-out connection's query and drop it instead of reusing it.
+
+    For a connection abandoned mid-result (a client hung up on a stream).
+    Making it reusable would mean reading every remaining row first, and even
+    disconnecting does that under the C extension, which frees the pending
+    result before closing. KILL QUERY, sent on a short-lived side connection,
+    makes MySQL end the result early instead. The pool reconnects this
+    connection on its next checkout.
+    """
+    try:
+        side = mysql.connector.connect(connection_timeout=REQUEST_RETRY.attempt_timeout, **DB_CONFIG)
+        try:
+            cursor = side.cursor()
+            cursor.execute("KILL QUERY %s", (conn.connection_id,))
+            cursor.close()
+        finally:
+            side.close()
+    except mysql.connector.Error as e:
+        print(f"Could not abort abandoned query: {e}")
+    conn.disconnect()
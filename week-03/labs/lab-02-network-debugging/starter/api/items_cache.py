@@ -0,0 +1,129 @@
+"""
+Read-through cache for /api/items pages.
+
+Tier 1 is an in-process TTL + LRU map. Tier 2, enabled by setting
+ITEMS_CACHE_REDIS_URL, is a Redis shared by every replica. Cached values are
+the serialized JSON bodies, so a hit skips MySQL and serialization.
+
+Every key embeds a version number that is bumped whenever rows are inserted,
+so one write makes all older pages unreachable at once. With Redis the
+version is shared; without it, each process has its own and pages written
+by another replica stay stale for at most ITEMS_CACHE_TTL seconds.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import redis
+from prometheus_client import Counter
+
+ITEMS_CACHE_ENABLED = os.environ.get("ITEMS_CACHE_ENABLED", "false").lower() == "true"
+ITEMS_CACHE_TTL = int(os.environ.get("ITEMS_CACHE_TTL", 30))
+ITEMS_CACHE_MAX_ENTRIES = int(os.environ.get("ITEMS_CACHE_MAX_ENTRIES", 1024))
+ITEMS_CACHE_REDIS_URL = os.environ.get("ITEMS_CACHE_REDIS_URL", "")
+
+VERSION_KEY = "items:cache:version"
+
+cache_requests = Counter(
+    "items_api_cache_requests", "Items cache lookups by tier and result", ["tier", "result"]
+)
+cache_evictions = Counter(
+    "items_api_cache_evictions", "Entries dropped from the in-process items cache", ["reason"]
+)
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire after ttl seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                cache_evictions.labels(reason="expired").inc()
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                cache_evictions.labels(reason="lru").inc()
+
+
+class ItemsCache:
+    """Two-tier read-through cache keyed by query parameters and data version."""
+
+    def __init__(self, ttl, max_entries, redis_url=""):
+        self.ttl = ttl
+        self.local = TTLCache(max_entries, ttl)
+        self.redis = None
+        if redis_url:
+            self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.local_version = 0
+
+    def version(self):
+        if self.redis is not None:
+            try:
+                return int(self.redis.get(VERSION_KEY) or 0)
+            except redis.RedisError:
+                pass
+        return self.local_version
+
+    def bump(self):
+        """Invalidate every cached page; call after inserting rows."""
+        self.local_version += 1
+        if self.redis is not None:
+            try:
+                self.redis.incr(VERSION_KEY)
+            except redis.RedisError:
+                pass
+
+    def get_or_load(self, params, loader):
+        """Return cached bytes for params, calling loader() on a miss."""
+        # JSON keeps None apart from "None" and a ":" inside a value from a separator
+        key = f"items:v{self.version()}:" + json.dumps(params, default=str, separators=(",", ":"))
+
+        body = self.local.get(key)
+        if body is not None:
+            cache_requests.labels(tier="local", result="hit").inc()
+            return body
+        cache_requests.labels(tier="local", result="miss").inc()
+
+        if self.redis is not None:
+            try:
+                body = self.redis.get(key)
+            except redis.RedisError:
+                cache_requests.labels(tier="redis", result="error").inc()
+            else:
+                if body is not None:
+                    cache_requests.labels(tier="redis", result="hit").inc()
+                    self.local.set(key, body)
+                    return body
+                cache_requests.labels(tier="redis", result="miss").inc()
+
+        body = loader()
+        self.local.set(key, body)
+        if self.redis is not None:
+            try:
+                self.redis.set(key, body, ex=self.ttl)
+            except redis.RedisError:
+                pass
+        return body
+
+
+items_cache = ItemsCache(ITEMS_CACHE_TTL, ITEMS_CACHE_MAX_ENTRIES, ITEMS_CACHE_REDIS_URL)
@@ -0,0 +1,156 @@
+"""
+Versioned schema migrations for the items API.
+
+Each migration runs once, in order, and is recorded in the schema_version
+table. Replicas that start together race for a MySQL advisory lock
+(GET_LOCK); the winner migrates, and the others skip straight to serving
+instead of queueing behind it. A replica that finds the schema already at
+the latest version never takes the lock at all.
+"""
+
+import os
+import time
+import mysql.connector
+from mysql.connector import errorcode
+
+LOCK_NAME = "items_api_migrations"
+
+# Seconds to wait for another replica's migration lock; 0 = don't wait
+DB_MIGRATION_LOCK_TIMEOUT = int(os.environ.get("DB_MIGRATION_LOCK_TIMEOUT", 0))
+
+# Seed data: the three sample items, padded with generated ones up to DB_SEED_ROWS
+DB_SEED_ROWS = int(os.environ.get("DB_SEED_ROWS", 3))
+DB_SEED_BATCH = int(os.environ.get("DB_SEED_BATCH", 1000))
+SAMPLE_ITEMS = ["Widget", "Gadget", "Doohickey"]
+
+
+def create_items_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def seed_items(cursor):
+    # Tables created before migrations existed may already hold data.
+    # LIMIT 1 reads a single row, unlike COUNT(*) which scans the table.
+    cursor.execute("SELECT 1 FROM items LIMIT 1")
+    if cursor.fetchone() is not None:
+        return 0
+    names = (
+        SAMPLE_ITEMS[i] if i < len(SAMPLE_ITEMS) else f"Item {i + 1}"
+        for i in range(max(DB_SEED_ROWS, 0))
+    )
+    inserted = 0
+    batch = []
+    for name in names:
+        batch.append((name,))
+        if len(batch) == DB_SEED_BATCH:
+            cursor.executemany("INSERT INTO items (name) VALUES (%s)", batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany("INSERT INTO items (name) VALUES (%s)", batch)
+        inserted += len(batch)
+    return inserted
+
+
+ITEMS_INDEXES = {
+    "idx_items_created_at": "created_at",
+    "idx_items_name": "name",
+}
+
+
+def index_items(cursor):
+    # InnoDB appends the primary key to every secondary index, so these also
+    # serve ORDER BY created_at, id and ORDER BY name, id without a filesort.
+    # DDL commits on its own, so a crash before schema_version is written
+    # leaves the indexes behind; only add the ones that are missing.
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics"
+        " WHERE table_schema = DATABASE() AND table_name = 'items'"
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = [name for name in ITEMS_INDEXES if name not in existing]
+    if not missing:
+        return
+    adds = ", ".join(f"ADD INDEX {name} ({ITEMS_INDEXES[name]})" for name in missing)
+    cursor.execute(f"ALTER TABLE items {adds}, ALGORITHM=INPLACE, LOCK=NONE")
+
+
+# (version, description, function(cursor)) — append only, never renumber
+MIGRATIONS = [
+    (1, "create items table", create_items_table),
+    (2, "seed sample items", seed_items),
+    (3, "index items by created_at and name", index_items),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    """Highest applied migration, or 0 if nothing has been applied yet."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except mysql.connector.ProgrammingError as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    return cursor.fetchone()[0] or 0
+
+
+def schema_is_current(conn):
+    """True once every migration has been applied (by this replica or another)."""
+    cursor = conn.cursor()
+    try:
+        return current_version(cursor) >= LATEST_VERSION
+    finally:
+        cursor.close()
+
+
+def migrate(conn):
+    """Bring the schema up to LATEST_VERSION.
+
+    Returns the list of versions applied by this call — empty when the schema
+    was already current or another replica holds the migration lock.
+    """
+    cursor = conn.cursor()
+    try:
+        if current_version(cursor) >= LATEST_VERSION:
+            return []
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, DB_MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            print("Another replica is migrating the schema; skipping")
+            return []
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Re-read under the lock: the previous holder may have finished
+            version = current_version(cursor)
+            applied = []
+            for number, description, apply in MIGRATIONS:
+                if number <= version:
+                    continue
+                start = time.monotonic()
+                apply(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (number, description),
+                )
+                conn.commit()
+                print(f"Applied migration {number} ({description}) in {time.monotonic() - start:.2f}s")
+                applied.append(number)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
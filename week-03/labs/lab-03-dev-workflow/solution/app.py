@@ -2,6 +2,8 @@ from flask import Flask
 import redis
 import os
 import socket
+from hit_counter import ShardedCounter
+from serve import serve
 
 app = Flask(__name__)
 
@@ -10,10 +12,20 @@ cache = redis.Redis(
     port=int(os.environ.get("REDIS_PORT", 6379)),
 )
 
+# Spread "hits" over this many keys (1 = the single hits key); shards are
+# picked per "process" or at "random" per hit, and optionally folded back
+# into "hits" every HITS_ROLLUP_INTERVAL seconds (0 = never)
+hits = ShardedCounter(
+    cache,
+    shards=int(os.environ.get("HITS_SHARDS", 1)),
+    pick=os.environ.get("HITS_SHARD_PICK", "process"),
+    rollup_interval=float(os.environ.get("HITS_ROLLUP_INTERVAL", 0)),
+)
+
 
 @app.route("/")
 def home():
-    count = cache.incr("hits")
+    count = hits.incr()
     hostname = socket.gethostname()
     return f"Welcome! You are visitor number {count}.\nHostname: {hostname}\n"
 
@@ -30,4 +42,8 @@ def health():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "0") == "1"
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    if debug:
+        # The reloader only exists in Flask's dev server
+        app.run(host="0.0.0.0", port=port, debug=True)
+    else:
+        serve(app, port)
@@ -0,0 +1,94 @@
+"""
+Sharded hit counter.
+
+A single "hits" key takes every replica's INCR, which makes it the hottest key
+in Redis. With shards > 1, each increment goes to one of hits:shard:0..N-1
+instead (one picked at random per process, or per hit), and the total is the
+sum of the shards plus the "hits" rollup, read in the same round trip with
+one MGET. An optional compactor periodically folds the shards back into the
+rollup so the total never drifts far from a single GET of "hits".
+
+With shards == 1 the counter is just INCR hits, as before.
+"""
+
+import os
+import random
+import threading
+import time
+import redis
+
+ROLLUP_KEY = "hits"
+
+# Atomically moves one shard's value into the rollup
+COMPACT_SCRIPT = """
+local value = tonumber(redis.call('GETSET', KEYS[1], 0) or 0)
+if value ~= 0 then
+    redis.call('INCRBY', KEYS[2], value)
+end
+return value
+"""
+
+
+class ShardedCounter:
+    """Counter spread over several Redis keys; read back with one MGET."""
+
+    def __init__(self, client, shards=1, pick="process", rollup_interval=0):
+        self.client = client
+        self.shards = max(shards, 1)
+        self.pick = pick
+        self.rollup_interval = rollup_interval
+        self.shard_keys = [f"{ROLLUP_KEY}:shard:{i}" for i in range(self.shards)]
+        self._compact = client.register_script(COMPACT_SCRIPT)
+        self._compactor_pid = None
+        self._shard_pid = None
+        self._process_shard = None
+        self._lock = threading.Lock()
+
+    def shard_key(self):
+        if self.pick == "random":
+            return random.choice(self.shard_keys)
+        # Picked at random once per process, and again after a fork. Not
+        # pid % shards: every replica's containers number their workers
+        # alike, so the same few shards would take all of the traffic
+        if self._shard_pid != os.getpid():
+            self._process_shard = random.choice(self.shard_keys)
+            self._shard_pid = os.getpid()
+        return self._process_shard
+
+    def incr(self):
+        """Count one hit and return the new total."""
+        if self.shards == 1:
+            return self.client.incr(ROLLUP_KEY)
+        self._ensure_compactor()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(self.shard_key())
+        pipe.mget([ROLLUP_KEY] + self.shard_keys)
+        _, values = pipe.execute()
+        return sum(int(value or 0) for value in values)
+
+    def total(self):
+        if self.shards == 1:
+            return int(self.client.get(ROLLUP_KEY) or 0)
+        return sum(int(value or 0) for value in self.client.mget([ROLLUP_KEY] + self.shard_keys))
+
+    def compact(self):
+        """Fold every shard into the rollup key; returns how much was moved."""
+        return sum(self._compact(keys=[key, ROLLUP_KEY]) for key in self.shard_keys)
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.rollup_interval)
+            try:
+                self.compact()
+            except redis.RedisError as e:
+                print(f"Hit counter compaction failed: {e}")
+
+    def _ensure_compactor(self):
+        # Threads don't survive fork(), so each pre-forked worker starts its own
+        if self.rollup_interval <= 0 or self._compactor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._compactor_pid == os.getpid():
+                return
+            self._compactor_pid = os.getpid()
+            threading.Thread(target=self._compact_loop, name="hits-compactor", daemon=True).start()
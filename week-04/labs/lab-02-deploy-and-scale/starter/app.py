@@ -1,6 +1,10 @@
-from flask import Flask
+from flask import Flask, Response, request
+from datetime import datetime, timezone
+import gzip
+import hashlib
 import os
 import socket
+from serve import serve
 
 app = Flask(__name__)
 
@@ -19,9 +23,9 @@ POD_NAMESPACE = os.environ.get("POD_NAMESPACE", "unknown")
 NODE_NAME = os.environ.get("NODE_NAME", "unknown")
 POD_IP = os.environ.get("POD_IP", "unknown")
 
-@app.route("/")
-def home():
-    return f"""
+# The home page only depends on env vars, so render it once at import, along
+# with its gzip encoding and validators, instead of on every request
+HOME_HTML = f"""
     <html>
     <head>
         <title>{STUDENT_NAME}'s App</title>
@@ -55,6 +59,24 @@ def home():
     </body>
     </html>
     """
+HOME_BODY = HOME_HTML.encode("utf-8")
+HOME_GZIP = gzip.compress(HOME_BODY, compresslevel=9, mtime=0)
+HOME_ETAG = hashlib.sha256(HOME_BODY).hexdigest()[:16]
+HOME_LAST_MODIFIED = datetime.now(timezone.utc).replace(microsecond=0)
+
+@app.route("/")
+def home():
+    use_gzip = request.accept_encodings["gzip"] > 0
+    response = Response(HOME_GZIP if use_gzip else HOME_BODY, mimetype="text/html")
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    # Each encoding is a different representation, so it gets its own ETag
+    response.set_etag(f"{HOME_ETAG}-gzip" if use_gzip else HOME_ETAG)
+    response.last_modified = HOME_LAST_MODIFIED
+    # Revalidate every time so scaling demos still show which pod answered
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route("/info")
 def info():
@@ -86,4 +108,4 @@ def student():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     print(f"Starting {STUDENT_NAME}'s app on port {port} (version {APP_VERSION})...")
-    app.run(host="0.0.0.0", port=port)
+    serve(app, port)
@@ -0,0 +1,77 @@
+"""
+Production server launcher for the course's Flask apps.
+
+app.run() is Werkzeug's development server: one process, no keep-alive
+tuning, and not meant to ship in a container. serve() runs the same app under
+gunicorn instead — pre-forked workers with threads, the app preloaded in the
+master so workers share its memory copy-on-write, periodic worker recycling,
+and a graceful drain on SIGTERM so rollouts don't drop in-flight requests.
+
+Tuning (all optional):
+    WEB_SERVER                    "gunicorn" (default) or "dev" for app.run()
+    WEB_CONCURRENCY               worker processes (default 2)
+    GUNICORN_THREADS              threads per worker (default 4)
+    GUNICORN_KEEPALIVE            seconds an idle keep-alive connection is held (default 5)
+    GUNICORN_MAX_REQUESTS         requests before a worker is recycled, 0 = never (default 1000)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests so workers don't recycle together (default 100)
+    GUNICORN_TIMEOUT              seconds before a stuck worker is killed (default 30)
+    GUNICORN_GRACEFUL_TIMEOUT     seconds workers get to finish after SIGTERM (default 25)
+"""
+
+import os
+import signal
+import sys
+
+
+def gunicorn_options(port):
+    """Gunicorn settings for this process, read from the environment."""
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+    return {
+        "bind": f"0.0.0.0:{port}",
+        "workers": int(os.environ.get("WEB_CONCURRENCY", 2)),
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "threads": threads,
+        "keepalive": int(os.environ.get("GUNICORN_KEEPALIVE", 5)),
+        "max_requests": int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000)),
+        "max_requests_jitter": int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100)),
+        "timeout": int(os.environ.get("GUNICORN_TIMEOUT", 30)),
+        # Stays under Kubernetes' default 30s terminationGracePeriodSeconds
+        "graceful_timeout": int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 25)),
+        "preload_app": True,
+        "accesslog": "-",
+    }
+
+
+def serve(app, port, on_worker_start=None, on_worker_exit=None):
+    """Run a WSGI app on port until SIGTERM.
+
+    on_worker_start is called once in every serving process (after fork
+    under gunicorn) — the place to start background threads, which don't
+    survive fork(). on_worker_exit(pid) is called in the gunicorn master
+    after a worker exits, e.g. to clean up per-process metrics files.
+    """
+    if os.environ.get("WEB_SERVER", "gunicorn") == "dev":
+        # Exit through sys.exit on SIGTERM so atexit hooks still run
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if on_worker_start:
+            on_worker_start()
+        app.run(host="0.0.0.0", port=port)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    options = gunicorn_options(port)
+    if on_worker_start:
+        options["post_fork"] = lambda server, worker: on_worker_start()
+    if on_worker_exit:
+        options["child_exit"] = lambda server, worker: on_worker_exit(worker.pid)
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
@@ -1,9 +1,28 @@
-from flask import Flask
+from flask import Flask, Response, request
 import os
 import socket
 import redis
+from redis_client import (
+    REDIS_HOST,
+    REDIS_PORT,
+    breaker_state,
+    get_redis,
+    is_available,
+    pool_stats,
+)
+from counters import queue_guestbook_entry, queue_visits
+from instrumentation import (
+    clear_multiproc_dir,
+    instrument_flask,
+    mark_worker_dead,
+    metrics_payload,
+    redis_timer,
+)
+from serve import serve
+from visit_buffer import VisitBuffer
 
 app = Flask(__name__)
+instrument_flask(app)
 
 # Application config
 GREETING = os.environ.get("GREETING", "Hello")
@@ -11,6 +30,9 @@ ENVIRONMENT = os.environ.get("ENVIRONMENT", "development")
 STUDENT_NAME = os.environ.get("STUDENT_NAME", "YOUR_NAME_HERE")
 GITHUB_USERNAME = os.environ.get("GITHUB_USERNAME", "YOUR_GITHUB_USERNAME")
 APP_VERSION = os.environ.get("APP_VERSION", "v5")
+# "wsgi" serves this Flask app under gunicorn (serve.py); "asgi" serves
+# app_asgi.py under uvicorn
+APP_MODE = os.environ.get("APP_MODE", "wsgi")
 
 # Kubernetes Downward API fields
 POD_NAME = os.environ.get("POD_NAME", socket.gethostname())
@@ -18,35 +40,20 @@ POD_NAMESPACE = os.environ.get("POD_NAMESPACE", "unknown")
 NODE_NAME = os.environ.get("NODE_NAME", "unknown")
 POD_IP = os.environ.get("POD_IP", "unknown")
 
-# Redis configuration — read from environment (ConfigMap + Secret)
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
-REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+# Redis configuration (REDIS_HOST, REDIS_PORT, REDIS_PASSWORD) is read from the
+# environment (ConfigMap + Secret) by redis_client.py, which owns the pool
+# and the circuit breaker
 
-# Connect to Redis
-def get_redis():
-    """Create a Redis connection. Returns None if Redis is unavailable."""
-    try:
-        r = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            password=REDIS_PASSWORD or None,
-            decode_responses=True,
-            socket_connect_timeout=2,
-        )
-        r.ping()
-        return r
-    except (redis.ConnectionError, redis.TimeoutError):
-        return None
+# Write-behind visit counting: buffer hits per process and flush with INCRBY
+VISITS_BUFFERED = os.environ.get("VISITS_BUFFERED", "false").lower() == "true"
+VISITS_FLUSH_INTERVAL = float(os.environ.get("VISITS_FLUSH_INTERVAL", 1))
+VISITS_FLUSH_THRESHOLD = int(os.environ.get("VISITS_FLUSH_THRESHOLD", 100))
 
-@app.route("/")
-def home():
-    r = get_redis()
-    visit_count = "unavailable"
-    if r:
-        visit_count = r.incr(f"visits:{GITHUB_USERNAME}")
+visit_buffer = VisitBuffer(get_redis, GITHUB_USERNAME, VISITS_FLUSH_INTERVAL, VISITS_FLUSH_THRESHOLD)
 
-    return f"""
+# Everything on the home page except the Redis block is fixed at startup from
+# env vars, so render and encode the static prefix and suffix once
+HOME_PREFIX = f"""
     <html>
     <head>
         <title>{STUDENT_NAME}'s App</title>
@@ -73,10 +80,8 @@ def home():
                 <p><strong>Environment:</strong> {ENVIRONMENT}</p>
                 <p><strong>Pod:</strong> <code>{POD_NAME}</code></p>
             </div>
-            <div class="redis {'connected' if r else ''}">
-                <p><strong>Redis:</strong> {'🟢 Connected' if r else '🔴 Disconnected'}</p>
-                <p><strong>Visits:</strong> {visit_count}</p>
-            </div>
+""".encode("utf-8")
+HOME_SUFFIX = """
             <div class="nav">
                 <a href="/info">/info</a>
                 <a href="/visits">/visits</a>
@@ -85,27 +90,76 @@ def home():
         </div>
     </body>
     </html>
-    """
+    """.encode("utf-8")
+
+def render_home(visit_count, connected):
+    """Home page bytes: the cached prefix and suffix around the Redis block."""
+    fragment = f"""
+            <div class="redis {'connected' if connected else ''}">
+                <p><strong>Redis:</strong> {'🟢 Connected' if connected else '🔴 Disconnected'}</p>
+                <p><strong>Visits:</strong> {visit_count if visit_count is not None else 'unavailable'}</p>
+            </div>
+"""
+    return HOME_PREFIX + fragment.encode("utf-8") + HOME_SUFFIX
+
+def count_visit():
+    """Record a visit. Returns (count, redis_connected); count is None if unavailable."""
+    if VISITS_BUFFERED:
+        visit_buffer.seed()
+        return visit_buffer.hit(), visit_buffer.last_flush_ok
+    try:
+        # INCR plus the aggregate hash and index, in one MULTI/EXEC round trip
+        with redis_timer("visit"):
+            return queue_visits(get_redis().pipeline(), GITHUB_USERNAME).execute()[0], True
+    except (redis.ConnectionError, redis.TimeoutError):
+        return None, False
+
+def timed_is_available():
+    with redis_timer("ping"):
+        return is_available()
+
+@app.route("/")
+def home():
+    visit_count, connected = count_visit()
+    response = Response(render_home(visit_count, connected), mimetype="text/html")
+    # Every GET counts a visit, so the page must never be served from a cache
+    response.cache_control.no_store = True
+    return response
 
 @app.route("/visits")
 def visits():
-    """Visit counter backed by Redis"""
-    r = get_redis()
-    if not r:
+    """Visit counter backed by Redis (approximate when buffered)"""
+    count, _ = count_visit()
+    if count is None:
         return {"error": "Redis unavailable", "redis_host": REDIS_HOST}, 503
 
-    count = r.incr(f"visits:{GITHUB_USERNAME}")
     return {
         "visits": count,
+        "buffered": VISITS_BUFFERED,
         "pod_name": POD_NAME,
         "student": GITHUB_USERNAME,
         "redis_host": REDIS_HOST,
     }
 
+@app.route("/guestbook", methods=["POST"])
+def guestbook():
+    """Leave a guestbook comment: JSON {"message": ...} or a form field"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = request.form
+    message = str(body.get("message", "")).strip()
+    if not message:
+        return {"error": "message is required"}, 400
+    try:
+        with redis_timer("guestbook"):
+            comments = queue_guestbook_entry(get_redis().pipeline(), GITHUB_USERNAME, message).execute()[0]
+    except (redis.ConnectionError, redis.TimeoutError):
+        return {"error": "Redis unavailable", "redis_host": REDIS_HOST}, 503
+    return {"comments": comments, "student": GITHUB_USERNAME}, 201
+
 @app.route("/info")
 def info():
     """Pod and configuration info"""
-    r = get_redis()
     return {
         "pod_name": POD_NAME,
         "pod_namespace": POD_NAMESPACE,
@@ -115,21 +169,29 @@ def info():
         "app_version": APP_VERSION,
         "student": STUDENT_NAME,
         "github_username": GITHUB_USERNAME,
-        "redis_connected": r is not None,
+        "redis_connected": timed_is_available(),
         "redis_host": REDIS_HOST,
+        "redis_pool": pool_stats(),
+        "visit_buffer": visit_buffer.stats() if VISITS_BUFFERED else None,
         "config_source": "environment",
     }
 
 @app.route("/health")
 def health():
     """Health check — app is healthy even if Redis is down (graceful degradation)"""
-    r = get_redis()
     return {
         "status": "healthy",
         "version": APP_VERSION,
-        "redis": "connected" if r else "disconnected",
+        "redis": "connected" if timed_is_available() else "disconnected",
+        "redis_circuit": breaker_state(),
     }
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics for this pod (all workers, when PROMETHEUS_MULTIPROC_DIR is set)"""
+    body, content_type = metrics_payload()
+    return body, 200, {"Content-Type": content_type}
+
 @app.route("/student")
 def student():
     """Student information endpoint"""
@@ -143,4 +205,10 @@ if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     print(f"Starting {STUDENT_NAME}'s app on port {port} (version {APP_VERSION})...")
     print(f"Redis: {REDIS_HOST}:{REDIS_PORT}")
-    app.run(host="0.0.0.0", port=port)
+    print(f"Mode: {APP_MODE}")
+    clear_multiproc_dir()
+    if APP_MODE == "asgi":
+        # Replace this process so app.py is imported once, by app_asgi
+        os.execvp("uvicorn", ["uvicorn", "app_asgi:app", "--host", "0.0.0.0", "--port", str(port)])
+    else:
+        serve(app, port, on_worker_exit=mark_worker_dead)
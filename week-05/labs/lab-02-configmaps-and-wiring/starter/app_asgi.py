@@ -0,0 +1,171 @@
+"""
+ASGI variant of the course app.
+
+Serves the same routes as app.py, but on an event loop with an asyncio Redis
+client and a shared connection pool, so a request waiting on Redis no longer
+holds a worker thread. Select it with APP_MODE=asgi, or run it directly:
+
+    uvicorn app_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import socket
+from urllib.parse import parse_qs
+import redis
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from app import (
+    APP_VERSION,
+    GITHUB_USERNAME,
+    NODE_NAME,
+    POD_IP,
+    POD_NAME,
+    POD_NAMESPACE,
+    STUDENT_NAME,
+    VISITS_BUFFERED,
+    render_home,
+    visit_buffer,
+)
+from counters import queue_guestbook_entry, queue_visits
+from instrumentation import ASGIMetricsMiddleware, metrics_payload, redis_timer, report_async_pool
+from redis_client import (
+    REDIS_HOST,
+    async_pool_stats,
+    breaker,
+    breaker_state,
+    close_async_redis,
+    get_async_redis,
+    is_available_async,
+)
+
+# Routes here use the asyncio pool; the sync pool would always report idle
+report_async_pool()
+
+
+async def count_visit():
+    """Record a visit. Returns (count, redis_connected); count is None if unavailable."""
+    if VISITS_BUFFERED:
+        if visit_buffer.redis_total is None:
+            # The buffer reads Redis with the sync client; keep that off the loop
+            await asyncio.to_thread(visit_buffer.seed)
+        return visit_buffer.hit(), visit_buffer.last_flush_ok
+    pipe = queue_visits(get_async_redis().pipeline(), GITHUB_USERNAME)
+    try:
+        with redis_timer("visit"):
+            return (await breaker.call_async(pipe.execute))[0], True
+    except (redis.ConnectionError, redis.TimeoutError):
+        return None, False
+
+
+async def timed_is_available():
+    with redis_timer("ping"):
+        return await is_available_async()
+
+
+async def home(request):
+    visit_count, connected = await count_visit()
+    return Response(
+        render_home(visit_count, connected),
+        media_type="text/html",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+async def visits(request):
+    """Visit counter backed by Redis (approximate when buffered)"""
+    count, _ = await count_visit()
+    if count is None:
+        return JSONResponse({"error": "Redis unavailable", "redis_host": REDIS_HOST}, status_code=503)
+
+    return JSONResponse({
+        "visits": count,
+        "buffered": VISITS_BUFFERED,
+        "pod_name": POD_NAME,
+        "student": GITHUB_USERNAME,
+        "redis_host": REDIS_HOST,
+    })
+
+
+async def guestbook(request):
+    """Leave a guestbook comment: JSON {"message": ...} or a form field"""
+    raw = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            body = None
+    else:
+        # Starlette's request.form() needs python-multipart; urlencoded is enough here
+        body = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+    message = str(body.get("message", "")).strip() if isinstance(body, dict) else ""
+    if not message:
+        return JSONResponse({"error": "message is required"}, status_code=400)
+    pipe = queue_guestbook_entry(get_async_redis().pipeline(), GITHUB_USERNAME, message)
+    try:
+        with redis_timer("guestbook"):
+            comments = (await breaker.call_async(pipe.execute))[0]
+    except (redis.ConnectionError, redis.TimeoutError):
+        return JSONResponse({"error": "Redis unavailable", "redis_host": REDIS_HOST}, status_code=503)
+    return JSONResponse({"comments": comments, "student": GITHUB_USERNAME}, status_code=201)
+
+
+async def info(request):
+    """Pod and configuration info"""
+    return JSONResponse({
+        "pod_name": POD_NAME,
+        "pod_namespace": POD_NAMESPACE,
+        "pod_ip": POD_IP,
+        "node_name": NODE_NAME,
+        "hostname": socket.gethostname(),
+        "app_version": APP_VERSION,
+        "student": STUDENT_NAME,
+        "github_username": GITHUB_USERNAME,
+        "redis_connected": await timed_is_available(),
+        "redis_host": REDIS_HOST,
+        "redis_pool": async_pool_stats(),
+        "visit_buffer": visit_buffer.stats() if VISITS_BUFFERED else None,
+        "config_source": "environment",
+    })
+
+
+async def health(request):
+    """Health check — app is healthy even if Redis is down (graceful degradation)"""
+    return JSONResponse({
+        "status": "healthy",
+        "version": APP_VERSION,
+        "redis": "connected" if await timed_is_available() else "disconnected",
+        "redis_circuit": breaker_state(),
+    })
+
+
+async def metrics(request):
+    """Prometheus metrics for this pod"""
+    body, content_type = metrics_payload()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+async def student(request):
+    """Student information endpoint"""
+    return JSONResponse({
+        "name": STUDENT_NAME,
+        "github_username": GITHUB_USERNAME,
+        "app_version": APP_VERSION,
+    })
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/visits", visits),
+        Route("/guestbook", guestbook, methods=["POST"]),
+        Route("/info", info),
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/student", student),
+    ],
+    middleware=[Middleware(ASGIMetricsMiddleware)],
+    on_shutdown=[close_async_redis],
+)
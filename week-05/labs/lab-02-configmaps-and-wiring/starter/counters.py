@@ -0,0 +1,135 @@
+"""
+Per-student counters kept alongside aggregate indexes.
+
+Every visit or guestbook write updates three keys in one MULTI/EXEC
+transaction:
+
+    visits:<username>      the student's own counter (as before)
+    visits                 hash of username -> visit count
+    index:visits           sorted set of usernames scored by visit count
+
+(and likewise guestbook:<username> / guestbook / index:guestbook), so readers
+such as the week-07 exporter can fetch every student with one HSCAN instead
+of SCANning the whole keyspace for visits:*.
+
+Keys written before these indexes existed are copied in once with:
+
+    python counters.py backfill
+
+which also prunes hash and index entries whose per-student key is gone (for
+example after a manual DEL). To remove a student everywhere at once:
+
+    python counters.py forget <username>
+"""
+
+import argparse
+import redis
+
+VISITS_HASH = "visits"
+VISITS_INDEX = "index:visits"
+GUESTBOOK_HASH = "guestbook"
+GUESTBOOK_INDEX = "index:guestbook"
+
+
+def queue_visits(pipe, student, amount=1):
+    """Queue a visit increment on a transactional pipeline.
+
+    Works with sync and asyncio pipelines alike; the first result of
+    execute() is the student's new visit count.
+    """
+    pipe.incrby(f"visits:{student}", amount)
+    pipe.hincrby(VISITS_HASH, student, amount)
+    pipe.zincrby(VISITS_INDEX, amount, student)
+    return pipe
+
+
+def queue_guestbook_entry(pipe, student, message):
+    """Queue a guestbook comment; the first result of execute() is the new comment count."""
+    pipe.lpush(f"guestbook:{student}", message)
+    pipe.hincrby(GUESTBOOK_HASH, student, 1)
+    pipe.zincrby(GUESTBOOK_INDEX, 1, student)
+    return pipe
+
+
+def queue_forget(pipe, student):
+    """Queue deleting every key and index entry for a student."""
+    pipe.delete(f"visits:{student}", f"guestbook:{student}")
+    pipe.hdel(VISITS_HASH, student)
+    pipe.zrem(VISITS_INDEX, student)
+    pipe.hdel(GUESTBOOK_HASH, student)
+    pipe.zrem(GUESTBOOK_INDEX, student)
+    return pipe
+
+
+# Copies one per-student key into the hash and index atomically, so a write
+# landing mid-backfill can't be counted twice or lost
+BACKFILL_SCRIPT = """
+local value
+if redis.call('TYPE', KEYS[1])['ok'] == 'list' then
+    value = redis.call('LLEN', KEYS[1])
+else
+    value = tonumber(redis.call('GET', KEYS[1]) or 0)
+end
+redis.call('HSET', KEYS[2], ARGV[1], value)
+redis.call('ZADD', KEYS[3], value, ARGV[1])
+return value
+"""
+
+
+# Drops a student's hash field and index entry if their key no longer exists;
+# checked atomically so a write recreating the key can't be pruned
+PRUNE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def backfill(r, batch_size=500):
+    """Sync the hashes and indexes with the visits:* and guestbook:* keys.
+
+    Idempotent: each student's hash field is overwritten with the current key
+    value, and fields whose key is gone are removed, so it is safe to re-run.
+    Returns {hash: (students copied, students pruned)}.
+    """
+    copy = r.register_script(BACKFILL_SCRIPT)
+    prune = r.register_script(PRUNE_SCRIPT)
+    results = {}
+    for prefix, hash_key, index_key in (
+        ("visits", VISITS_HASH, VISITS_INDEX),
+        ("guestbook", GUESTBOOK_HASH, GUESTBOOK_INDEX),
+    ):
+        copied = pruned = 0
+        for key in r.scan_iter(match=f"{prefix}:*", count=batch_size):
+            student = key.split(":", 1)[1]
+            copy(keys=[key, hash_key, index_key], args=[student])
+            copied += 1
+        for student, _ in list(r.hscan_iter(hash_key, count=batch_size)):
+            pruned += prune(keys=[f"{prefix}:{student}", hash_key, index_key], args=[student])
+        results[hash_key] = (copied, pruned)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["backfill", "forget"])
+    parser.add_argument("student", nargs="?", help="username to forget")
+    parser.add_argument("--batch-size", type=int, default=500, help="keys per SCAN page")
+    args = parser.parse_args()
+    if args.command == "forget" and not args.student:
+        parser.error("forget needs a username")
+
+    from redis_client import get_redis
+
+    try:
+        if args.command == "forget":
+            queue_forget(get_redis().pipeline(), args.student).execute()
+            print(f"Forgot {args.student}")
+        else:
+            for hash_key, (copied, pruned) in backfill(get_redis(), args.batch_size).items():
+                print(f"Backfilled {copied} students into {hash_key}, pruned {pruned}")
+    except redis.RedisError as e:
+        raise SystemExit(f"{args.command.capitalize()} failed: {e}")
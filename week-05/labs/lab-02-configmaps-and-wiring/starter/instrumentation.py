@@ -0,0 +1,220 @@
+"""
+Request and Redis instrumentation for the course app.
+
+Every request is timed into a histogram by route and status code, with an
+in-flight gauge per route; Redis calls made by the routes get a histogram of
+their own, so Redis time can be told apart from the rest of the request.
+Redis pool usage and circuit breaker state are read from the serving process
+at scrape time.
+
+Label children for every known route and status are resolved once at import,
+so recording an observation is a dict lookup plus an increment rather than a
+labels() call building a label tuple on every request.
+
+Under a pre-fork server each worker has its own registry, so a scrape would
+only see whichever worker answered it. Set PROMETHEUS_MULTIPROC_DIR to a
+writable directory and prometheus_client keeps values in per-process mmap
+files there; /metrics then aggregates all of them.
+"""
+
+import glob
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from redis_client import CircuitBreaker, async_pool_stats, breaker_state, pool_stats
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    # Value files are created as soon as the metrics below are defined
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Anything else is reported as "other" to keep label cardinality bounded
+ROUTES = ("/", "/visits", "/guestbook", "/info", "/health", "/metrics", "/student")
+STATUSES = (200, 201, 400, 404, 405, 500, 503)
+REDIS_OPERATIONS = ("visit", "guestbook", "ping")
+
+request_seconds = Histogram(
+    "course_app_request_duration_seconds", "Request latency by route and status", ["route", "status"]
+)
+requests_in_flight = Gauge(
+    "course_app_requests_in_flight",
+    "Requests currently being served, by route",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+redis_seconds = Histogram(
+    "course_app_redis_call_duration_seconds",
+    "Latency of Redis calls made while serving requests",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+REQUEST_CHILDREN = {
+    (route, status): request_seconds.labels(route=route, status=str(status))
+    for route in ROUTES + ("other",)
+    for status in STATUSES
+}
+IN_FLIGHT_CHILDREN = {route: requests_in_flight.labels(route=route) for route in ROUTES + ("other",)}
+REDIS_CHILDREN = {operation: redis_seconds.labels(operation=operation) for operation in REDIS_OPERATIONS}
+
+
+class CircuitCollector:
+    """Redis circuit breaker state of the process serving the scrape (1 = current)."""
+
+    def collect(self):
+        circuit = GaugeMetricFamily(
+            "course_app_redis_circuit_state", "Redis circuit breaker state (1 = current)", labels=["state"]
+        )
+        current = breaker_state()
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            circuit.add_metric([state], 1 if current == state else 0)
+        yield circuit
+
+
+class RedisPoolCollector:
+    """Redis connection pool usage of the process serving the scrape.
+
+    stats is pool_stats by default; app_asgi.py switches it to
+    async_pool_stats with report_async_pool(), since its routes use the
+    asyncio pool.
+    """
+
+    def __init__(self, stats=pool_stats):
+        self.stats = stats
+
+    def collect(self):
+        return self.families(self.stats())
+
+    def describe(self):
+        # Otherwise registering with REGISTRY would call collect(), creating
+        # the Redis client at import, i.e. in the gunicorn master
+        return self.families({})
+
+    def families(self, stats):
+        yield GaugeMetricFamily(
+            "course_app_redis_pool_in_use", "Redis connections currently checked out", value=stats.get("in_use")
+        )
+        yield GaugeMetricFamily(
+            "course_app_redis_pool_max", "Maximum Redis connections in the pool", value=stats.get("max_connections")
+        )
+        yield CounterMetricFamily(
+            "course_app_redis_pool_checkouts", "Connections checked out of the pool", value=stats.get("checkouts")
+        )
+        yield CounterMetricFamily(
+            "course_app_redis_pool_wait_seconds",
+            "Seconds spent waiting to check a connection out of the pool",
+            value=stats.get("wait_seconds_total"),
+        )
+
+
+pool_collector = RedisPoolCollector()
+
+if not PROMETHEUS_MULTIPROC_DIR:
+    REGISTRY.register(CircuitCollector())
+    REGISTRY.register(pool_collector)
+
+
+def report_async_pool():
+    """Export the asyncio pool's usage instead of the sync pool's (app_asgi.py)."""
+    pool_collector.stats = async_pool_stats
+
+
+def route_label(path):
+    return path if path in IN_FLIGHT_CHILDREN else "other"
+
+
+def observe_request(route, status, seconds):
+    child = REQUEST_CHILDREN.get((route, status))
+    if child is None:
+        child = request_seconds.labels(route=route, status=str(status))
+    child.observe(seconds)
+
+
+def redis_timer(operation):
+    """Context manager timing one Redis call: `with redis_timer("visit"): ...`"""
+    return REDIS_CHILDREN[operation].time()
+
+
+def instrument_flask(app):
+    """Time every request to a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_route = route_label(request.path)
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT_CHILDREN[g.metrics_route].inc()
+
+    @app.after_request
+    def record_request(response):
+        observe_request(g.metrics_route, response.status_code, time.perf_counter() - g.metrics_start)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        # Runs even when a view raised, so the gauge can't drift upwards
+        if "metrics_route" in g:
+            IN_FLIGHT_CHILDREN[g.metrics_route].dec()
+
+
+class ASGIMetricsMiddleware:
+    """Pure ASGI middleware doing the same for app_asgi.py."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = route_label(scope["path"])
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT_CHILDREN[route]
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            observe_request(route, status, time.perf_counter() - start)
+
+
+def metrics_payload():
+    """Return (body, content_type) for /metrics, merged across workers if multiprocess."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Like the circuit state, pool usage belongs to the worker serving the scrape
+    registry.register(CircuitCollector())
+    registry.register(pool_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def clear_multiproc_dir():
+    """Delete value files left by a previous run; call before starting workers."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+
+
+def mark_worker_dead(pid):
+    """Drop a dead worker's live gauge files so its in-flight count stops adding up."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
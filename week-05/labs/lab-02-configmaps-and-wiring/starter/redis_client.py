@@ -0,0 +1,370 @@
+"""
+Shared, long-lived Redis client for the course app and metrics exporter.
+
+Every process owns one bounded connection pool. Connections are reused across
+requests instead of reconnecting per call, liveness comes from redis-py's
+health_check_interval instead of a PING before every use, and reconnects back
+off exponentially. A circuit breaker wraps every command so that, once Redis
+is known to be down, callers fail fast instead of waiting out connect timeouts.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.client import Pipeline
+from redis.retry import Retry
+
+# Same env vars as the app (ConfigMap + Secret)
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+
+# Pool tuning
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 20))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_RETRIES = int(os.environ.get("REDIS_RETRIES", 1))
+REDIS_BACKOFF_BASE = float(os.environ.get("REDIS_BACKOFF_BASE", 0.05))
+REDIS_BACKOFF_CAP = float(os.environ.get("REDIS_BACKOFF_CAP", 1))
+
+# Circuit breaker tuning
+REDIS_BREAKER_FAILURES = int(os.environ.get("REDIS_BREAKER_FAILURES", 5))
+REDIS_BREAKER_RESET_TIMEOUT = float(os.environ.get("REDIS_BREAKER_RESET_TIMEOUT", 10))
+REDIS_BREAKER_HALF_OPEN_CALLS = int(os.environ.get("REDIS_BREAKER_HALF_OPEN_CALLS", 1))
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+
+
+class CircuitOpenError(redis.ConnectionError):
+    """Raised instead of calling Redis while the circuit is open.
+
+    Subclasses redis.ConnectionError so existing graceful-degradation
+    handlers treat it like any other outage.
+    """
+
+
+class PoolTimeoutError(redis.ConnectionError):
+    """Every pooled connection stayed busy for REDIS_POOL_TIMEOUT seconds.
+
+    Redis was never contacted, so the circuit breaker doesn't count this as a
+    failure; it still subclasses redis.ConnectionError for existing handlers.
+    """
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker for Redis calls.
+
+    closed: calls go through; REDIS_BREAKER_FAILURES consecutive connection
+    failures open the circuit.
+    open: calls fail immediately with CircuitOpenError until
+    REDIS_BREAKER_RESET_TIMEOUT seconds have passed.
+    half_open: up to REDIS_BREAKER_HALF_OPEN_CALLS trial calls go through; a
+    success closes the circuit, a failure opens it again.
+
+    An error reply (WRONGTYPE, NOSCRIPT, ...) counts as a success, since the
+    server answered. A call that never reached Redis (pool exhausted,
+    cancelled, non-Redis exception) changes nothing but gives back its trial
+    slot, so the circuit can't get stuck half-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout, half_open_calls):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Redis circuit is open")
+                self.state = self.HALF_OPEN
+                self.trial_calls = 0
+            if self.state == self.HALF_OPEN:
+                if self.trial_calls >= self.half_open_calls:
+                    raise CircuitOpenError("Redis circuit is half-open")
+                self.trial_calls += 1
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release_trial(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.trial_calls > 0:
+                self.trial_calls -= 1
+
+    def record_error(self, error):
+        """Classify an exception raised by a call that passed before_call()."""
+        if isinstance(error, (CircuitOpenError, PoolTimeoutError)) or not isinstance(error, redis.RedisError):
+            self.release_trial()
+        elif isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.record_error(e)
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        self.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            self.record_error(e)
+            raise
+        self.record_success()
+        return result
+
+
+breaker = CircuitBreaker(REDIS_BREAKER_FAILURES, REDIS_BREAKER_RESET_TIMEOUT, REDIS_BREAKER_HALF_OPEN_CALLS)
+
+
+class BreakerPipeline(Pipeline):
+    """Pipeline whose execute() goes through the circuit breaker."""
+
+    def execute(self, raise_on_error=True):
+        return breaker.call(super().execute, raise_on_error)
+
+
+class BreakerRedis(redis.Redis):
+    """Redis client whose commands and pipelines go through the circuit breaker."""
+
+    def execute_command(self, *args, **options):
+        return breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return BreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedPool(redis.BlockingConnectionPool):
+    """BlockingConnectionPool that records checkouts and time spent waiting.
+
+    Callers block for up to REDIS_POOL_TIMEOUT seconds when every connection
+    is busy instead of opening more sockets than max_connections. The wait
+    happens here, on a semaphore with one slot per connection, so running
+    out of connections raises PoolTimeoutError rather than the plain
+    redis.ConnectionError redis-py would use for a dead server.
+    """
+
+    def reset(self):
+        # Also runs in a forked child, which must not inherit the parent's
+        # counts, slots or (possibly held) lock
+        super().reset()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._checked_out = set()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+
+    @property
+    def in_use(self):
+        return len(self._checked_out)
+
+    def get_connection(self, *args, **kwargs):
+        start = time.monotonic()
+        # After a fork, reset() swaps in fresh slots; do that before taking
+        # one, or the slot would be given back to the wrong semaphore
+        self._checkpid()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError("No connection available.")
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            self._checked_out.add(connection)
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        # redis-py also calls this for a connection that failed to connect
+        # during get_connection(); that slot is given back there instead
+        with self._stats_lock:
+            if connection not in self._checked_out:
+                return
+            self._checked_out.remove(connection)
+        self._slots.release()
+
+
+class GatedAsyncPool(redis.asyncio.BlockingConnectionPool):
+    """asyncio BlockingConnectionPool that raises PoolTimeoutError when exhausted.
+
+    Records checkouts and wait time like InstrumentedPool. Only the event
+    loop touches the counts, so they need no lock.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Created inside the event loop (see get_async_redis), so never inherited across fork
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self._checked_out = set()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+
+    @property
+    def in_use(self):
+        return len(self._checked_out)
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError("No connection available.") from None
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._checked_out.add(connection)
+        self.checkouts += 1
+        self.wait_seconds_total += time.monotonic() - start
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        if connection in self._checked_out:
+            self._checked_out.remove(connection)
+            self._slots.release()
+
+
+def get_redis():
+    """Return the process-wide Redis client, creating its pool on first use.
+
+    No PING is sent here — commands raise redis.ConnectionError (including
+    CircuitOpenError) or redis.TimeoutError if Redis is unreachable, so
+    callers handle those.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                pool = InstrumentedPool(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    password=REDIS_PASSWORD or None,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    socket_keepalive=True,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                    retry=Retry(ExponentialBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+                    retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                )
+                _client = BreakerRedis(connection_pool=pool)
+    return _client
+
+
+def get_async_redis():
+    """Return the process-wide asyncio Redis client used by the ASGI app.
+
+    Same settings as get_redis(), with its own pool. Connections belong to
+    the running event loop, so only call this from inside that loop.
+    Commands are not routed through the breaker automatically; wrap them
+    with breaker.call_async().
+    """
+    global _async_client
+    if _async_client is None:
+        pool = GatedAsyncPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD or None,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_keepalive=True,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            retry=AsyncRetry(ExponentialBackoff(cap=REDIS_BACKOFF_CAP, base=REDIS_BACKOFF_BASE), REDIS_RETRIES),
+            retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+        )
+        _async_client = redis.asyncio.Redis(connection_pool=pool)
+    return _async_client
+
+
+def is_available():
+    """PING Redis through the pool. Meant for health checks, not hot paths."""
+    try:
+        return bool(get_redis().ping())
+    except (redis.ConnectionError, redis.TimeoutError):
+        return False
+
+
+async def close_async_redis():
+    """Disconnect the asyncio pool, if one was created (ASGI shutdown hook)."""
+    if _async_client is not None:
+        await _async_client.connection_pool.disconnect()
+
+
+async def is_available_async():
+    """Async is_available() for the ASGI app."""
+    try:
+        return bool(await breaker.call_async(get_async_redis().ping))
+    except (redis.ConnectionError, redis.TimeoutError):
+        return False
+
+
+def pool_stats():
+    """Snapshot of pool usage for /health, /info or a metrics collector."""
+    pool = get_redis().connection_pool
+    with pool._stats_lock:
+        return {
+            "max_connections": pool.max_connections,
+            "in_use": pool.in_use,
+            "checkouts": pool.checkouts,
+            "wait_seconds_total": round(pool.wait_seconds_total, 6),
+        }
+
+
+def async_pool_stats():
+    """Same snapshot for the asyncio pool; zeros until get_async_redis() creates it."""
+    if _async_client is None:
+        return {"max_connections": REDIS_MAX_CONNECTIONS, "in_use": 0, "checkouts": 0, "wait_seconds_total": 0.0}
+    pool = _async_client.connection_pool
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": pool.in_use,
+        "checkouts": pool.checkouts,
+        "wait_seconds_total": round(pool.wait_seconds_total, 6),
+    }
+
+
+def breaker_state():
+    """Current circuit breaker state: "closed", "open" or "half_open"."""
+    return breaker.state
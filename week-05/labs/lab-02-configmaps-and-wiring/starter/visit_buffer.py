@@ -0,0 +1,118 @@
+"""
+Write-behind buffering for the visit counter.
+
+Instead of one INCR per request, each process counts hits in memory and a
+background thread flushes them to Redis with a single INCRBY transaction
+(see counters.py) every flush_interval seconds, or sooner once
+flush_threshold hits are pending.
+The count reported to callers is the last Redis total plus the hits still
+pending locally, so it is approximate across replicas, and at most one
+flush window of hits is lost if the process dies without draining. A new or
+recycled worker has no Redis total to add to, so hit() reports None until
+one is known rather than counting up from zero; callers that can block call
+seed() first to read it.
+"""
+
+import atexit
+import os
+import threading
+import time
+import redis
+from counters import queue_visits
+
+
+class VisitBuffer:
+    """Per-process in-memory visit counter flushed to Redis with INCRBY."""
+
+    def __init__(self, get_redis, student, flush_interval=1.0, flush_threshold=100):
+        self.get_redis = get_redis
+        self.student = student
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._seed_attempted_at = None
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        self.pending = 0
+        self.redis_total = None  # Redis value after our last successful flush
+        self.flushes = 0
+        self.last_flush_ok = False
+
+    def seed(self):
+        """Read the Redis total now if it isn't known yet. Blocks on Redis.
+
+        One thread reads while the others wait for it, and after a failed
+        read the next try waits flush_interval (the flusher keeps trying
+        meanwhile), so a Redis outage doesn't block every hit.
+        """
+        if self.redis_total is not None:
+            return
+        with self._seed_lock:
+            now = time.monotonic()
+            if self.redis_total is not None or (
+                self._seed_attempted_at is not None and now - self._seed_attempted_at < self.flush_interval
+            ):
+                return
+            self._seed_attempted_at = now
+            self.flush()
+
+    def hit(self):
+        """Count one visit and return the locally approximated total (None if unknown).
+
+        Never touches Redis, so it is safe to call from an event loop.
+        """
+        self._ensure_flusher()
+        with self._lock:
+            self.pending += 1
+            count = None if self.redis_total is None else self.redis_total + self.pending
+            if self.pending >= self.flush_threshold:
+                self._wake.set()
+        return count
+
+    def flush(self):
+        """Push pending hits to Redis. Hits are put back if Redis is unavailable."""
+        with self._lock:
+            pending, self.pending = self.pending, 0
+            if pending == 0 and self.redis_total is not None:
+                return
+        try:
+            # INCRBY 0 just reads the current total on the first flush
+            total = queue_visits(self.get_redis().pipeline(), self.student, pending).execute()[0]
+        except (redis.ConnectionError, redis.TimeoutError):
+            with self._lock:
+                self.pending += pending
+            self.last_flush_ok = False
+            return
+        with self._lock:
+            self.redis_total = total
+            self.flushes += 1
+        self.last_flush_ok = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "redis_total": self.redis_total,
+                "flushes": self.flushes,
+                "last_flush_ok": self.last_flush_ok,
+            }
+
+    def _flush_loop(self):
+        while True:
+            # The first pass seeds redis_total straight away
+            self.flush()
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork(), so each pre-forked worker starts its own
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="visit-flusher", daemon=True).start()
+            # Drain whatever is still buffered on a clean shutdown
+            atexit.register(self.flush)
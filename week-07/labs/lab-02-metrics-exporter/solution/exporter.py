@@ -7,73 +7,414 @@ This is a read-only exporter — it should never modify Redis.
 
 from flask import Flask
 import os
+import threading
+import time
 import redis
-from prometheus_client import Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    generate_latest,
+    multiprocess,
+    CONTENT_TYPE_LATEST,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from redis_client import REDIS_HOST, REDIS_PORT, breaker_state, get_redis, is_available, pool_stats
+from serve import serve
 
 app = Flask(__name__)
 
-# Redis configuration — same env vars as your app (Week 5)
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
-REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+# Redis configuration — same env vars as your app (Week 5), read by redis_client.py
+
+# Keys per SCAN/HSCAN page, and per MGET / pipelined LLEN batch — one round trip each
+BATCH_SIZE = int(os.environ.get("EXPORTER_BATCH_SIZE", 500))
+
+# "scan" walks the keyspace for visits:* and guestbook:* keys, so a deleted key
+# drops its series on the next collection. "hash" reads the visits and
+# guestbook hashes the Week 5 app keeps up to date (student -> count), so
+# scrape cost follows the number of students; the hashes only lose a student
+# through `python counters.py forget <username>` or a backfill's prune pass.
+EXPORTER_SOURCE = os.environ.get("EXPORTER_SOURCE", "scan")
+VISITS_HASH = "visits"
+GUESTBOOK_HASH = "guestbook"
+
+# "gauges" updates module-level Gauges; "collector" builds each scrape from one
+# Redis read with a custom Collector and shares no mutable state between scrapes
+EXPORTER_MODE = os.environ.get("EXPORTER_MODE", "gauges")
+
+# 0 collects on every scrape; >0 rebuilds the snapshot in the background every N seconds
+REFRESH_INTERVAL = float(os.environ.get("EXPORTER_REFRESH_INTERVAL", 0))
+# With a refresher, /metrics returns 503 once the snapshot is older than this
+MAX_AGE = float(os.environ.get("EXPORTER_MAX_AGE", 60))
 
-# Define Prometheus metrics
-visits_gauge = Gauge("course_visits_total", "Total visit count per student", ["student"])
+# Set to a writable directory to run several gunicorn workers: prometheus_client
+# then keeps each worker's values in mmap files there, and /metrics aggregates
+# them so every scrape sees the same numbers whichever worker answers it
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# Guards gauge updates so /metrics never serializes a half-applied snapshot
+snapshot_lock = threading.Lock()
+refresher_lock = threading.Lock()
+last_refresh = None  # time.monotonic() of the last successful collection
+refresher_thread = None
+
+# Define Prometheus metrics. multiprocess_mode only applies with
+# PROMETHEUS_MULTIPROC_DIR: every worker refreshes from the same Redis, so the
+# newest write among live workers is the current value.
+visits_gauge = Gauge(
+    "course_visits_total", "Total visit count per student", ["student"], multiprocess_mode="livemostrecent"
+)
 guestbook_gauge = Gauge(
-    "course_guestbook_comments", "Number of guestbook comments per student", ["student"]
+    "course_guestbook_comments",
+    "Number of guestbook comments per student",
+    ["student"],
+    multiprocess_mode="livemostrecent",
+)
+scrape_duration_gauge = Gauge(
+    "course_exporter_scrape_duration_seconds",
+    "Seconds spent reading Redis in the last collection",
+    multiprocess_mode="livemostrecent",
+)
+scrape_round_trips_gauge = Gauge(
+    "course_exporter_scrape_round_trips",
+    "Redis round trips made by the last collection",
+    multiprocess_mode="livemostrecent",
+)
+last_refresh_gauge = Gauge(
+    "course_exporter_last_refresh_timestamp_seconds",
+    "Unix time of the last successful Redis collection",
+    multiprocess_mode="max",
+)
+evicted_counter = Counter(
+    "course_exporter_evicted_series",
+    "Per-student series removed because the student disappeared from Redis (summed over workers)",
+    ["metric"],
 )
 
+# Students exported by the previous collection, per gauge. Anything missing
+# from the next collection is removed so the registry tracks live Redis state.
+exported_students = {visits_gauge: set(), guestbook_gauge: set()}
 
-def get_redis():
-    """Create a Redis connection. Returns None if unavailable."""
-    try:
-        r = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            password=REDIS_PASSWORD or None,
-            decode_responses=True,
-            socket_connect_timeout=2,
+
+class RedisPoolCollector:
+    """Exposes the shared Redis connection pool's usage and circuit state."""
+
+    def collect(self):
+        return self.families(pool_stats())
+
+    def describe(self):
+        # Otherwise registering with REGISTRY would call collect(), creating
+        # the Redis client at import, i.e. in the gunicorn master
+        return self.families({})
+
+    def families(self, stats):
+        yield GaugeMetricFamily(
+            "course_exporter_redis_pool_in_use", "Redis connections currently checked out", value=stats.get("in_use")
         )
-        r.ping()
-        return r
-    except (redis.ConnectionError, redis.TimeoutError):
-        return None
+        yield GaugeMetricFamily(
+            "course_exporter_redis_pool_max", "Maximum Redis connections in the pool", value=stats.get("max_connections")
+        )
+        yield CounterMetricFamily(
+            "course_exporter_redis_pool_checkouts", "Connections checked out of the pool", value=stats.get("checkouts")
+        )
+        yield CounterMetricFamily(
+            "course_exporter_redis_pool_wait_seconds",
+            "Seconds spent waiting to check a connection out of the pool",
+            value=stats.get("wait_seconds_total"),
+        )
+        circuit = GaugeMetricFamily(
+            "course_exporter_redis_circuit_state", "Redis circuit breaker state (1 = current)", labels=["state"]
+        )
+        for state in ("closed", "open", "half_open"):
+            circuit.add_metric([state], 1 if breaker_state() == state else 0)
+        yield circuit
+
+
+REGISTRY.register(RedisPoolCollector())
+
+
+def scan_pages(r, pattern):
+    """Yield pages of keys matching pattern, one SCAN round trip per page."""
+    cursor = 0
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match=pattern, count=BATCH_SIZE)
+        yield keys
+        if cursor == 0:
+            return
+
+
+def fetch_visits(r, keys):
+    """Read a page of visits:<username> counters with a single MGET."""
+    return r.mget(keys)
+
+
+def fetch_guestbook(r, keys):
+    """Read a page of guestbook:<username> list lengths in one pipeline."""
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.llen(key)
+    return pipe.execute()
+
+
+def read_counts(r, pattern, fetch):
+    """Return ({student: count}, round_trips) for every key matching pattern."""
+    counts = {}
+    round_trips = 0
+    for keys in scan_pages(r, pattern):
+        round_trips += 1
+        if not keys:
+            continue
+        values = fetch(r, keys)
+        round_trips += 1
+        for key, value in zip(keys, values):
+            counts[key.split(":", 1)[1]] = int(value or 0)
+    return counts, round_trips
+
+
+def read_hash(r, key):
+    """Return ({student: count}, round_trips) from a student -> count hash.
+
+    HSCAN pages through large hashes without blocking Redis; a small hash
+    comes back whole on the first call, just like HGETALL.
+    """
+    counts = {}
+    round_trips = 0
+    cursor = 0
+    while True:
+        cursor, fields = r.hscan(key, cursor=cursor, count=BATCH_SIZE)
+        round_trips += 1
+        for student, value in fields.items():
+            counts[student] = int(value)
+        if cursor == 0:
+            return counts, round_trips
+
+
+def read_all_counts(r):
+    """Return (visits, comments, round_trips) from the configured EXPORTER_SOURCE."""
+    if EXPORTER_SOURCE == "scan":
+        # Keys are visits:<username> and guestbook:<username>
+        visits, visit_trips = read_counts(r, "visits:*", fetch_visits)
+        comments, comment_trips = read_counts(r, "guestbook:*", fetch_guestbook)
+    else:
+        visits, visit_trips = read_hash(r, VISITS_HASH)
+        comments, comment_trips = read_hash(r, GUESTBOOK_HASH)
+    return visits, comments, visit_trips + comment_trips
+
+
+def sweep_stale(gauge, metric, current):
+    """Remove label sets not seen in the current collection pass."""
+    stale = exported_students[gauge] - current.keys()
+    for student in stale:
+        gauge.remove(student)
+    if stale:
+        evicted_counter.labels(metric=metric).inc(len(stale))
+    exported_students[gauge] = set(current)
 
 
 def collect_metrics():
-    """Read current state from Redis and update Prometheus gauges."""
+    """Read current state from Redis and update Prometheus gauges.
+
+    Returns False if Redis is unavailable and the gauges were left untouched.
+    """
+    global last_refresh
     r = get_redis()
-    if not r:
-        return
+    start = time.monotonic()
+    try:
+        visits, comments, round_trips = read_all_counts(r)
+    except (redis.ConnectionError, redis.TimeoutError):
+        return False
+
+    with snapshot_lock:
+        for student, count in visits.items():
+            visits_gauge.labels(student=student).set(count)
+        for student, count in comments.items():
+            guestbook_gauge.labels(student=student).set(count)
+        sweep_stale(visits_gauge, "course_visits_total", visits)
+        sweep_stale(guestbook_gauge, "course_guestbook_comments", comments)
+
+        scrape_round_trips_gauge.set(round_trips)
+        scrape_duration_gauge.set(time.monotonic() - start)
+        last_refresh = time.monotonic()
+        last_refresh_gauge.set(time.time())
+    return True
+
+
+class RedisStateCollector:
+    """Custom Collector that reads Redis once per scrape.
+
+    Metric families are built fresh on every collect(), so concurrent scrapes
+    under a threaded server each serialize their own consistent snapshot, and
+    series for deleted keys simply stop appearing.
+    """
+
+    def collect(self):
+        r = get_redis()
+        start = time.monotonic()
+        try:
+            visits, comments, round_trips = read_all_counts(r)
+        except (redis.ConnectionError, redis.TimeoutError):
+            return
+
+        visits_family = GaugeMetricFamily(
+            "course_visits_total", "Total visit count per student", labels=["student"]
+        )
+        for student, count in visits.items():
+            visits_family.add_metric([student], count)
+        guestbook_family = GaugeMetricFamily(
+            "course_guestbook_comments", "Number of guestbook comments per student", labels=["student"]
+        )
+        for student, count in comments.items():
+            guestbook_family.add_metric([student], count)
+
+        yield visits_family
+        yield guestbook_family
+        yield GaugeMetricFamily(
+            "course_exporter_scrape_round_trips",
+            "Redis round trips made by the last collection",
+            value=round_trips,
+        )
+        yield GaugeMetricFamily(
+            "course_exporter_scrape_duration_seconds",
+            "Seconds spent reading Redis in the last collection",
+            value=time.monotonic() - start,
+        )
+
+
+collector_registry = CollectorRegistry()
+collector_registry.register(RedisStateCollector())
+collector_registry.register(RedisPoolCollector())
 
-    # Collect visit counts — keys are visits:<username>
-    for key in r.scan_iter(match="visits:*"):
-        student = key.split(":", 1)[1]
-        count = int(r.get(key) or 0)
-        visits_gauge.labels(student=student).set(count)
 
-    # Collect guestbook counts — keys are guestbook:<username>
-    for key in r.scan_iter(match="guestbook:*"):
-        student = key.split(":", 1)[1]
-        count = r.llen(key)
-        guestbook_gauge.labels(student=student).set(count)
+def snapshot_age():
+    """Seconds since the last successful collection (inf before the first one)."""
+    if last_refresh is None:
+        return float("inf")
+    return time.monotonic() - last_refresh
+
+
+if not PROMETHEUS_MULTIPROC_DIR:
+    # A function gauge has no value file to aggregate; the multiprocess
+    # collector below reports this worker's age itself
+    snapshot_age_gauge = Gauge(
+        "course_exporter_snapshot_age_seconds", "Seconds since the last successful Redis collection"
+    )
+    snapshot_age_gauge.set_function(snapshot_age)
+
+
+class MultiProcessSnapshotCollector:
+    """Aggregates every worker's value files into one snapshot for /metrics.
+
+    Gauge.remove() only forgets a series in the calling process; its last
+    value stays in each worker's file. Students missing from this worker's
+    latest collection are therefore filtered out here, as sweep_stale() does
+    for a single process, and the snapshot age reported is this worker's, so
+    it describes the student set actually exported. /metrics refuses to
+    serve (503) from a worker that hasn't collected yet.
+    """
+
+    student_metrics = {"course_visits_total": visits_gauge, "course_guestbook_comments": guestbook_gauge}
+
+    def __init__(self):
+        self.files = multiprocess.MultiProcessCollector(None)
+
+    def collect(self):
+        for metric in self.files.collect():
+            gauge = self.student_metrics.get(metric.name)
+            if gauge is not None:
+                live = exported_students[gauge]
+                metric.samples = [s for s in metric.samples if s.labels["student"] in live]
+            yield metric
+        yield GaugeMetricFamily(
+            "course_exporter_snapshot_age_seconds",
+            "Seconds since the last successful Redis collection",
+            value=snapshot_age(),
+        )
+
+
+multiprocess_registry = CollectorRegistry()
+if PROMETHEUS_MULTIPROC_DIR:
+    multiprocess_registry.register(MultiProcessSnapshotCollector())
+    # Pool usage and circuit state belong to the worker serving the scrape
+    multiprocess_registry.register(RedisPoolCollector())
+
+
+def refresh_loop():
+    """Rebuild the gauge snapshot every REFRESH_INTERVAL seconds."""
+    while True:
+        try:
+            collect_metrics()
+        except Exception as e:
+            # Anything else (a non-numeric counter, a bug) would end the thread
+            # and leave /metrics answering 503 for good
+            print(f"Snapshot refresh failed: {e!r}")
+        time.sleep(REFRESH_INTERVAL)
+
+
+def ensure_refresher():
+    """Start the background refresher in this process if it isn't running.
+
+    Threads don't survive fork(), so a pre-forked worker starts its own: a
+    thread object inherited from the parent reports is_alive() False.
+    """
+    global refresher_thread
+    with refresher_lock:
+        if refresher_thread is not None and refresher_thread.is_alive():
+            return
+        refresher_thread = threading.Thread(target=refresh_loop, name="snapshot-refresher", daemon=True)
+        refresher_thread.start()
 
 
 @app.route("/metrics")
 def metrics():
-    """Collect metrics from Redis and return in Prometheus format."""
-    collect_metrics()
-    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    """Return the gauge snapshot in Prometheus format.
+
+    Without a refresher, Redis is read on every scrape. With one, scrapes only
+    serialize the last snapshot, so Redis load is independent of scraper count.
+    In collector mode every scrape builds its own snapshot from one Redis read.
+    """
+    if EXPORTER_MODE == "collector":
+        return generate_latest(collector_registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    if REFRESH_INTERVAL > 0:
+        ensure_refresher()
+        if snapshot_age() > MAX_AGE:
+            return f"metrics snapshot older than {MAX_AGE:g}s\n", 503, {"Content-Type": "text/plain"}
+    else:
+        collect_metrics()
+    if PROMETHEUS_MULTIPROC_DIR and last_refresh is None:
+        # This worker (just forked or recycled) doesn't know which students
+        # are live yet, so it can't filter the other workers' value files
+        return "this worker has not collected a snapshot yet\n", 503, {"Content-Type": "text/plain"}
+    with snapshot_lock:
+        body = generate_latest(multiprocess_registry if PROMETHEUS_MULTIPROC_DIR else REGISTRY)
+    return body, 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
 
 @app.route("/health")
 def health():
-    r = get_redis()
-    return {"status": "healthy", "redis": "connected" if r else "disconnected"}
+    return {
+        "status": "healthy",
+        "redis": "connected" if is_available() else "disconnected",
+        "redis_circuit": breaker_state(),
+    }
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 9100))
     print(f"Metrics exporter starting on port {port}")
     print(f"Redis: {REDIS_HOST}:{REDIS_PORT}")
-    app.run(host="0.0.0.0", port=port)
+    print(f"Mode: {EXPORTER_MODE}, source: {EXPORTER_SOURCE}")
+    on_worker_start = None
+    if REFRESH_INTERVAL > 0 and EXPORTER_MODE != "collector":
+        print(f"Refreshing snapshot every {REFRESH_INTERVAL:g}s (max age {MAX_AGE:g}s)")
+        on_worker_start = ensure_refresher
+    on_worker_exit = None
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Start from an empty directory and drop each dead worker's live gauges
+        for name in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+            if name.endswith(".db"):
+                os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, name))
+        on_worker_exit = multiprocess.mark_process_dead
+    serve(app, port, on_worker_start=on_worker_start, on_worker_exit=on_worker_exit)